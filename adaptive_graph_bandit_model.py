@@ -6,6 +6,7 @@ import scipy
 import os 
 os.chdir('../code/')
 from learn_lap_optimization_algorithm import * 
+from linalg_utils import ConfidenceState
 
 class Adaptive_LAPUCB():
 	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, beta, delta, sigma, mu, lambda_):
@@ -30,11 +31,13 @@ class Adaptive_LAPUCB():
 		self.lambda_=lambda_ ## step size
 		self.c=0 # confidence bound
 		self.covariance=self.alpha*self.A
+		self.cov_inv=np.linalg.pinv(self.covariance)
+		self.conf=ConfidenceState(self.covariance)
 		self.bias=np.zeros(self.user_num*self.dimension)
 
 
 	def update_c(self):
-		self.c=self.sigma*np.sqrt(2*np.log(np.linalg.det(self.covariance)**(1/2)*np.linalg.det(self.alpha*self.A)**(-1/2)/self.delta))+self.alpha*np.linalg.norm(self.true_user_feature_vector)
+		self.c=self.conf.radius(self.sigma, self.delta)+self.alpha*np.linalg.norm(self.true_user_feature_vector)
 
 	def select_item(self, item_pool, user_index):
 		item_fs=self.item_feature_matrix[item_pool]
@@ -44,7 +47,7 @@ class Adaptive_LAPUCB():
 		self.update_c()
 		for j in range(self.pool_size):
 			x=item_feature_array[j]
-			x_norm=np.sqrt(np.dot(np.dot(x, np.linalg.pinv(self.covariance)),x))
+			x_norm=np.sqrt(np.dot(np.dot(x, self.cov_inv),x))
 			est_y=np.dot(x, self.user_feature)+self.c*x_norm
 			estimated_payoffs[j]=est_y
 
@@ -57,9 +60,11 @@ class Adaptive_LAPUCB():
 		return true_payoff, selected_item_feature, regret
 
 	def update_user_feature(self, true_payoff, selected_item_feature):
+		## no rank-1 log-det step here, update_A resets conf from the new covariance right after
 		self.covariance+=np.outer(selected_item_feature, selected_item_feature)
 		self.bias+=true_payoff*selected_item_feature
-		self.user_feature=np.dot(np.linalg.pinv(self.covariance), self.bias)
+		self.cov_inv=np.linalg.pinv(self.covariance)
+		self.user_feature=np.dot(self.cov_inv, self.bias)
 		self.user_feature_matrix=self.user_feature.reshape(self.user_num, self.dimension)
 
 	def update_A(self):
@@ -69,6 +74,8 @@ class Adaptive_LAPUCB():
 		self.L[self.L<=1e-4]=0
 		self.A=np.kron(self.L, np.identity(self.dimension))
 		self.covariance+=self.alpha*(self.A-A_t_1)
+		self.cov_inv=np.linalg.pinv(self.covariance)
+		self.conf.reset(self.covariance, logdet_0=self.user_num*self.dimension*np.log(self.alpha)+self.dimension*np.linalg.slogdet(self.L)[1])
 
 	def run(self,  user_array, item_pool_array, iteration, true_lap):
 		cumulative_regret=[0]
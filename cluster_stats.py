@@ -0,0 +1,86 @@
+import numpy as np
+from linalg_utils import sherman_morrison_update
+
+class ClusterStatistics():
+	## running per-cluster sums of X^T X and X^T y, moved between clusters by subtraction
+	## cluster_cov(label)=prior+count*base+sum of member X^T X, its inverse is cached
+	def __init__(self, labels, dimension, base=None, prior=None, refresh=100):
+		self.dimension=dimension
+		self.labels=np.array(labels, dtype=np.int64)
+		self.user_num=len(self.labels)
+		self.user_xx=np.zeros((self.user_num, self.dimension, self.dimension))
+		self.user_bias=np.zeros((self.user_num, self.dimension))
+		if base is None:
+			base=np.zeros((self.dimension, self.dimension))
+		if prior is None:
+			prior=np.identity(self.dimension)
+		self.base=base
+		self.prior=prior
+		self.refresh=refresh
+		self.xx={}
+		self.bias={}
+		self.count={}
+		self.inv={}
+		self.inv_counter={}
+		for label, count in zip(*np.unique(self.labels, return_counts=True)):
+			self.new_cluster(label)
+			self.count[label]=count
+
+	def new_cluster(self, label):
+		self.xx[label]=np.zeros((self.dimension, self.dimension))
+		self.bias[label]=np.zeros(self.dimension)
+		self.count[label]=0
+
+	def add(self, user_index, x, y):
+		label=self.labels[user_index]
+		xx=np.outer(x, x)
+		self.user_xx[user_index]+=xx
+		self.user_bias[user_index]+=y*x
+		self.xx[label]+=xx
+		self.bias[label]+=y*x
+		if label in self.inv:
+			self.inv_counter[label]+=1
+			if self.inv_counter[label]%self.refresh==0:
+				del self.inv[label]
+			else:
+				sherman_morrison_update(self.inv[label], x)
+
+	def relabel(self, labels):
+		## users whose label changed are moved in groups of (old, new) label pairs
+		labels=np.asarray(labels)
+		moved=np.flatnonzero(labels!=self.labels)
+		if moved.size==0:
+			return moved
+		pairs=np.stack([self.labels[moved], labels[moved]], axis=1)
+		groups, group_index=np.unique(pairs, axis=0, return_inverse=True)
+		group_index=np.ravel(group_index)
+		for g, (old, new) in enumerate(groups):
+			users=moved[group_index==g]
+			xx=np.sum(self.user_xx[users], axis=0)
+			bias=np.sum(self.user_bias[users], axis=0)
+			if new not in self.xx:
+				self.new_cluster(new)
+			self.xx[old]-=xx
+			self.bias[old]-=bias
+			self.count[old]-=len(users)
+			self.xx[new]+=xx
+			self.bias[new]+=bias
+			self.count[new]+=len(users)
+			self.inv.pop(old, None)
+			self.inv.pop(new, None)
+			if self.count[old]==0:
+				del self.xx[old], self.bias[old], self.count[old]
+		self.labels[moved]=labels[moved]
+		return moved
+
+	def cluster_cov(self, label):
+		return self.prior+self.count[label]*self.base+self.xx[label]
+
+	def cluster_inv(self, label):
+		if label not in self.inv:
+			self.inv[label]=np.linalg.inv(self.cluster_cov(label))
+			self.inv_counter[label]=0
+		return self.inv[label]
+
+	def cluster_bias(self, label):
+		return self.bias[label]
@@ -3,32 +3,43 @@ from sklearn.metrics.pairwise import rbf_kernel
 from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
+from linalg_utils import score_pool, refreshed_inverse_update, ConfidenceState
+from environment import Environment
+import instrumentation
 
 class COLIN():
-	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, true_adj, alpha, delta, sigma, beta, state):
+	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, true_adj, alpha, delta, sigma, beta, state, refresh=100, graph_update='full'):
 		self.true_adj=true_adj
 		self.state=state
 		self.user_num=user_num
 		self.w=np.identity(self.user_num)
-		self.lap=csgraph.laplacian(self.w, normed=True)
+		## 'row' re-estimates only the served user's row and column of w each round
+		self.graph_update=graph_update
+		self.degree=np.sum(self.w, axis=1)-np.diag(self.w)
+		self.lap=None
 		self.dimension=dimension
 		self.item_num=item_num
 		self.pool_size=pool_size
 		self.alpha=alpha
 		self.V=self.alpha*np.identity(self.user_num*self.dimension)
 		self.B=np.zeros(self.user_num*self.dimension)
-		self.V_inv=np.linalg.pinv(self.V)
+		self.V_inv=np.identity(self.user_num*self.dimension)/self.alpha
+		self.conf=ConfidenceState(None, logdet=self.user_num*self.dimension*np.log(self.alpha))
+		self.refresh=refresh
+		self.update_counter=0
 		self.true_user_feature_matrix=true_user_feature_matrix
 		self.true_user_feature_vector=self.true_user_feature_matrix.flatten()
 		self.true_payoffs=true_payoffs
+		self.environment=None
 		self.item_feature_matrix=item_feature_matrix
 		self.user_f_matrix=np.zeros((self.dimension, self.user_num))
 		self.co_user_f_matrix=np.zeros((self.dimension, self.user_num))
+		self.co_user_f_dirty=False
 		self.true_co_user_f_vector=np.dot(self.true_user_feature_matrix.T, self.w).flatten()
 		self.user_f_vector=np.zeros((self.user_num*self.dimension))
 		self.user_ridge=np.zeros((self.dimension, self.user_num))
 		self.user_ls=np.zeros((self.dimension, self.user_num))
-		self.big_w=np.kron(self.w.T, np.identity(self.dimension))
+		self.big_w=None
 		self.beta=beta
 		self.sigma=sigma 
 		self.delta=delta
@@ -38,6 +49,7 @@ class COLIN():
 		self.user_bias={}
 		self.user_counter={}
 		self.graph_error=[]
+		self.graph_sq_error=np.sum((self.w-self.true_adj)**2)
 
 	def initial(self):
 		for u in range(self.user_num):
@@ -47,46 +59,51 @@ class COLIN():
 			self.user_counter[u]=0
 
 
+	def get_co_user_f_matrix(self):
+		if self.co_user_f_dirty:
+			self.co_user_f_matrix=np.dot(self.user_f_matrix, self.w)
+			self.co_user_f_dirty=False
+		return self.co_user_f_matrix
+
+	def get_big_w(self):
+		if self.big_w is None:
+			self.big_w=np.kron(self.w.T, np.identity(self.dimension))
+		return self.big_w
+
+	def get_lap(self):
+		## normalised Laplacian from the maintained degrees, self loops ignored as in csgraph.laplacian
+		if self.lap is None:
+			connected=self.degree>0
+			scale=np.zeros(self.user_num)
+			scale[connected]=1.0/np.sqrt(self.degree[connected])
+			off_diag=self.w-np.diag(np.diag(self.w))
+			self.lap=np.diag(connected.astype(float))-scale[:,None]*off_diag*scale[None,:]
+		return self.lap
+
 	def update_beta(self): 
-		a=np.linalg.det(self.V)**(1/2)
-		b=np.linalg.det(self.alpha*np.identity(self.user_num*self.dimension))**(-1/2)
-		beta=self.sigma*np.sqrt(2*np.log(a*b/self.delta))+np.sqrt(self.alpha)*np.linalg.norm(self.co_user_f_matrix.flatten())
+		beta=self.conf.radius(self.sigma, self.delta)+np.sqrt(self.alpha)*np.linalg.norm(self.get_co_user_f_matrix().flatten())
 		self.beta_list.extend([beta])
 
 	def select_item(self, item_pool, user_index, time):
-		est_payoffs=np.zeros(self.pool_size)
-		self.V_inv=np.linalg.pinv(self.V)
+		item_fs=self.item_feature_matrix[item_pool]
+		## co_x is w[:, user] kron x, so V_inv is projected to a d x d block once per pool
+		c=self.w[:, user_index]
+		n, d=self.user_num, self.dimension
+		proj_V_inv=np.einsum('a,aibj,b->ij', c, self.V_inv.reshape((n, d, n, d)), c, optimize=True)
+		if self.co_user_f_dirty:
+			theta=np.dot(self.user_f_matrix, self.w[:, user_index])
+		else:
+			theta=self.co_user_f_matrix[:, user_index]
 		if self.state==False:
 			self.update_beta()
-			for j in range(self.pool_size):
-				item_index=item_pool[j]
-				item_f=self.item_feature_matrix[item_index]
-				item_f_matrix=np.zeros((self.dimension, self.user_num))
-				item_f_matrix[:, user_index]=item_f 
-				item_f_vector=item_f_matrix.flatten('F')
-				co_item_f_vector=np.dot(item_f_matrix, self.w.T).flatten('F')
-				mean=np.dot(self.co_user_f_matrix.flatten('F'), item_f_vector)
-				var=np.sqrt(np.dot(np.dot(co_item_f_vector, self.V_inv), co_item_f_vector))
-				est_payoff=mean+self.beta*var
-				est_payoffs[j]=est_payoff
+			max_index, means, var=score_pool(item_fs, theta, proj_V_inv, self.beta)
 		else:
-			for j in range(self.pool_size):
-				item_index=item_pool[j]
-				item_f=self.item_feature_matrix[item_index]
-				item_f_matrix=np.zeros((self.dimension, self.user_num))
-				item_f_matrix[:, user_index]=item_f 
-				item_f_vector=item_f_matrix.flatten('F')
-				co_item_f_vector=np.dot(item_f_matrix, self.w.T).flatten('F')
-				mean=np.dot(self.co_user_f_matrix.flatten('F'), item_f_vector)
-				var=np.sqrt(np.dot(np.dot(co_item_f_vector, self.V_inv), co_item_f_vector))
-				est_payoff=mean+self.beta*var*np.sqrt(np.log(time+1))
-				est_payoffs[j]=est_payoff
+			max_index, means, var=score_pool(item_fs, theta, proj_V_inv, self.beta*np.sqrt(np.log(time+1)))
 
-		max_index=np.argmax(est_payoffs)
 		item_index=item_pool[max_index]
 		selected_item_feature=self.item_feature_matrix[item_index]
 		true_payoff=self.true_payoffs[user_index, item_index]
-		max_payoff=np.max(self.true_payoffs[user_index][item_pool])
+		max_payoff=self.environment.best_payoffs[time]
 		regret=max_payoff-true_payoff
 		return true_payoff, selected_item_feature, regret
 
@@ -95,12 +112,14 @@ class COLIN():
 		x_matrix=np.zeros((self.dimension, self.user_num))
 		x_matrix[:,user_index]=selected_item_feature
 		co_x=np.dot(x_matrix, self.w.T).flatten('F')
+		self.conf.update(co_x, self.V_inv)
 		self.V+=np.outer(co_x,co_x)
 		self.B+=y*co_x
-		self.V_inv=np.linalg.pinv(self.V)
+		self.update_counter+=1
+		refreshed_inverse_update(self.V_inv, self.V, co_x, self.update_counter, self.refresh)
 		self.user_f_vector=np.dot(self.V_inv, self.B)
 		self.user_f_matrix=self.user_f_vector.reshape((self.user_num, self.dimension)).T
-		self.co_user_f_matrix=np.dot(self.user_f_matrix, self.w)
+		self.co_user_f_dirty=True
 		self.user_xx[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_v[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_bias[user_index]+=y*selected_item_feature
@@ -114,15 +133,39 @@ class COLIN():
 		self.user_ls[:, user_index]=np.dot(xx_inv, self.user_bias[user_index])
 
 	def update_graph(self, user_index):
-		# w_row=rbf_kernel(self.user_f_matrix.T[user_index].reshape(1,-1), self.user_f_matrix.T, gamma=0.5)
-		# self.w[user_index]=w_row
-		# self.w[:,user_index]=w_row
-		self.w=rbf_kernel(self.user_f_matrix.T, gamma=0.5)
-		self.lap=csgraph.laplacian(self.w, normed=True)
-		graph_error=np.linalg.norm(self.w-self.true_adj)
+		if self.graph_update=='row':
+			self.update_graph_row(user_index)
+		else:
+			self.w=rbf_kernel(self.user_f_matrix.T, gamma=0.5)
+			self.degree=np.sum(self.w, axis=1)-np.diag(self.w)
+			self.graph_sq_error=np.sum((self.w-self.true_adj)**2)
+		## the Laplacian and big_w are rebuilt only when next asked for
+		self.lap=None
+		self.big_w=None
+		graph_error=np.sqrt(max(self.graph_sq_error, 0.0))
 		self.graph_error.extend([graph_error])
 
-	def run(self, user_array, item_pool_array, iteration):
+	def update_graph_row(self, user_index):
+		## row and column user_index of w, the degrees and the squared graph error in O(nd)
+		u=user_index
+		w_row=rbf_kernel(self.user_f_matrix.T[u].reshape(1,-1), self.user_f_matrix.T, gamma=0.5)[0]
+		self.graph_sq_error-=self.cross_sq_error(u)
+		self.degree+=w_row-self.w[:, u]
+		self.degree[u]=np.sum(w_row)-w_row[u]
+		self.w[u]=w_row
+		self.w[:, u]=w_row
+		self.graph_sq_error+=self.cross_sq_error(u)
+
+	def cross_sq_error(self, u):
+		## squared error of row and column u, the (u,u) entry counted once
+		row_error=np.sum((self.w[u]-self.true_adj[u])**2)
+		col_error=np.sum((self.w[:, u]-self.true_adj[:, u])**2)
+		return row_error+col_error-(self.w[u, u]-self.true_adj[u, u])**2
+
+	def run(self, user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		self.environment=environment
 		self.initial()
 		cumulative_regret=[0]
 		learning_error_list=np.zeros(iteration)
@@ -134,14 +177,10 @@ class COLIN():
 			self.user_counter[user_index]+=1
 			true_payoff, selected_item_feature, regret=self.select_item(item_pool, user_index, time)
 			self.update_user_feature(true_payoff, selected_item_feature, user_index)
+			error=np.linalg.norm(self.get_co_user_f_matrix()-self.true_user_feature_matrix.T)
 			self.update_graph(user_index)
-			error=np.linalg.norm(self.co_user_f_matrix-self.true_user_feature_matrix.T)
 			cumulative_regret.extend([cumulative_regret[-1]+regret])
 			learning_error_list[time]=error 
 		return np.array(cumulative_regret[1:]), learning_error_list, self.beta_list, self.graph_error
 
-
-
-
-
-		
\ No newline at end of file
+instrumentation.register(COLIN, ['update_beta', 'select_item', 'update_user_feature', 'update_graph'])
@@ -17,25 +17,39 @@ from lapucb import LAPUCB
 from lapucb_sim import LAPUCB_SIM
 from club import CLUB
 from utils import *
+from results_store import ResultsStore
 path='../bandit_results/simulated/'
 np.random.seed(2018)
 
-smoothness_list=np.load(path+'smoothness_list.npy')
-graphucb_rbf=np.load(path+'graphucb_smooth_rbf.npy')
-graphucb_er=np.load(path+'graphucb_smooth_er.npy')
-graphucb_ba=np.load(path+'graphucb_smooth_ba.npy')
-graphucb_ws=np.load(path+'graphucb_smooth_ws.npy')
+store=ResultsStore(path+'results_store/')
 
-graphucb_local_rbf=np.load(path+'graphucb_local_smooth_rbf.npy')
-graphucb_local_er=np.load(path+'graphucb_local_smooth_er.npy')
-graphucb_local_ba=np.load(path+'graphucb_local_smooth_ba.npy')
-graphucb_local_ws=np.load(path+'graphucb_local_smooth_ws.npy')
+def smooth_curve(algorithm, graph):
+	## final cumulative regret against smoothness, averaged over the seeds of each smooth level
+	records=store.select(algorithm, graph)
+	smooth_levels=sorted(set(record['params']['smooth'] for record in records))
+	smoothness=np.zeros(len(smooth_levels))
+	regret=np.zeros(len(smooth_levels))
+	for index, smooth in enumerate(smooth_levels):
+		runs=store.select(algorithm, graph, smooth=smooth)
+		smoothness[index]=np.mean([record['params']['smoothness'] for record in runs])
+		regret[index]=np.mean([store.final(record, 'regret') for record in runs])
+	return smoothness, regret
+
+smoothness_rbf, graphucb_rbf=smooth_curve('lapucb', 'rbf')
+smoothness_er, graphucb_er=smooth_curve('lapucb', 'er')
+smoothness_ba, graphucb_ba=smooth_curve('lapucb', 'ba')
+smoothness_ws, graphucb_ws=smooth_curve('lapucb', 'ws')
+
+smoothness_local_rbf, graphucb_local_rbf=smooth_curve('lapucb_sim', 'rbf')
+smoothness_local_er, graphucb_local_er=smooth_curve('lapucb_sim', 'er')
+smoothness_local_ba, graphucb_local_ba=smooth_curve('lapucb_sim', 'ba')
+smoothness_local_ws, graphucb_local_ws=smooth_curve('lapucb_sim', 'ws')
 
 plt.figure(figsize=(5,5))
-plt.plot(smoothness_list, graphucb_rbf, '-*',color='b', markevery=0.1, label='RBF')
-plt.plot(smoothness_list, graphucb_er, '-o',color='g', markevery=0.1, label='ER')
-plt.plot(smoothness_list, graphucb_ba, '-p',color='r', markevery=0.1, label='BA')
-plt.plot(smoothness_list, graphucb_ws, '-s',color='k', markevery=0.1, label='WS')
+plt.plot(smoothness_rbf, graphucb_rbf, '-*',color='b', markevery=0.1, label='RBF')
+plt.plot(smoothness_er, graphucb_er, '-o',color='g', markevery=0.1, label='ER')
+plt.plot(smoothness_ba, graphucb_ba, '-p',color='r', markevery=0.1, label='BA')
+plt.plot(smoothness_ws, graphucb_ws, '-s',color='k', markevery=0.1, label='WS')
 plt.xlabel('Smoothness', fontsize=16)
 plt.ylabel('Cumulative Regret', fontsize=16)
 plt.title('sp=0.4', fontsize=16)
@@ -46,10 +60,10 @@ plt.savefig(path+'graphucb_smooth_graphs'+'.png', dpi=100)
 plt.show()
 
 plt.figure(figsize=(5,5))
-plt.plot(smoothness_list, graphucb_local_rbf, '-*',color='b', markevery=0.1, label='RBF')
-plt.plot(smoothness_list, graphucb_local_er, '-o',color='g', markevery=0.1, label='ER')
-plt.plot(smoothness_list, graphucb_local_ba, '-p',color='r', markevery=0.1, label='BA')
-plt.plot(smoothness_list, graphucb_local_ws, '-s',color='k', markevery=0.1, label='WS')
+plt.plot(smoothness_local_rbf, graphucb_local_rbf, '-*',color='b', markevery=0.1, label='RBF')
+plt.plot(smoothness_local_er, graphucb_local_er, '-o',color='g', markevery=0.1, label='ER')
+plt.plot(smoothness_local_ba, graphucb_local_ba, '-p',color='r', markevery=0.1, label='BA')
+plt.plot(smoothness_local_ws, graphucb_local_ws, '-s',color='k', markevery=0.1, label='WS')
 plt.xlabel('Smoothness', fontsize=16)
 plt.ylabel('Cumulative Regret', fontsize=16)
 # plt.title('sp=0.4', fontsize=16)
@@ -0,0 +1,58 @@
+import numpy as np
+
+class DeletionConnectivity():
+	## connected components of a graph whose edges are only ever deleted
+	## a deletion at a user can only split that user's component, so only it is searched again
+	## expand(frontier) returns the boolean mask of all neighbours of the frontier users
+	def __init__(self, user_num, expand, labels=None):
+		self.user_num=user_num
+		self.expand=expand
+		if labels is None:
+			self.labels=np.zeros(self.user_num, dtype=np.int64)
+		else:
+			self.labels=np.array(labels, dtype=np.int64)
+		self.cluster_num=len(np.unique(self.labels))
+		self.next_label=int(np.max(self.labels))+1
+		self.split_events=[]
+
+	def search(self, source, allowed, targets=None):
+		## breadth-first search inside allowed, stopping early once all targets are reached
+		visited=np.zeros(self.user_num, dtype=bool)
+		visited[source]=True
+		frontier=np.array([source])
+		while frontier.size>0:
+			if targets is not None and visited[targets].all():
+				return visited, True
+			reached=self.expand(frontier)&allowed&~visited
+			frontier=np.flatnonzero(reached)
+			visited[frontier]=True
+		return visited, targets is None or visited[targets].all()
+
+	def delete_edges(self, user_index, removed, time=None):
+		## removed are the users whose edge to user_index was just deleted
+		removed=np.asarray(removed, dtype=np.int64)
+		if removed.size==0:
+			return []
+		label=self.labels[user_index]
+		members=self.labels==label
+		removed=removed[members[removed]]
+		if removed.size==0:
+			return []
+		visited, connected=self.search(user_index, members, removed)
+		if connected:
+			return []
+		## the component split: the part holding user_index keeps its label, the rest are relabelled
+		remaining=members&~visited
+		pieces=[]
+		while remaining.any():
+			piece, _=self.search(np.flatnonzero(remaining)[0], remaining)
+			self.labels[piece]=self.next_label
+			pieces.extend([self.next_label])
+			self.next_label+=1
+			remaining&=~piece
+		self.cluster_num+=len(pieces)
+		self.split_events.extend([(time, int(user_index), int(label), pieces)])
+		return pieces
+
+	def members(self, label):
+		return np.flatnonzero(self.labels==label)
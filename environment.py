@@ -0,0 +1,31 @@
+import numpy as np
+
+
+class Environment():
+	## oracle side of a run: every pool's payoffs, best arm and best payoff for all rounds, computed up front
+	## with path, pool_payoffs is a .npy memmap filled block by block, for horizons that do not fit in memory
+	def __init__(self, user_array, item_pool_array, true_payoffs, iteration=None, path=None, block=65536):
+		if iteration is None:
+			iteration=len(user_array)
+		self.iteration=iteration
+		self.user_array=np.asarray(user_array)[:iteration]
+		self.item_pool_array=np.asarray(item_pool_array)[:iteration]
+		shape=self.item_pool_array.shape
+		if path is None:
+			self.pool_payoffs=np.asarray(true_payoffs)[self.user_array[:, None], self.item_pool_array]
+		else:
+			self.pool_payoffs=np.lib.format.open_memmap(path, mode='w+', dtype=np.asarray(true_payoffs).dtype, shape=shape)
+		self.best_arms=np.zeros(iteration, dtype=int)
+		self.best_payoffs=np.zeros(iteration)
+		for start in range(0, iteration, block):
+			end=min(start+block, iteration)
+			if path is not None:
+				self.pool_payoffs[start:end]=true_payoffs[self.user_array[start:end, None], self.item_pool_array[start:end]]
+			rows=self.pool_payoffs[start:end]
+			self.best_arms[start:end]=np.argmax(rows, axis=1)
+			self.best_payoffs[start:end]=rows[np.arange(end-start), self.best_arms[start:end]]
+		if path is not None:
+			self.pool_payoffs.flush()
+
+	def regret(self, time, payoff):
+		return self.best_payoffs[time]-payoff
@@ -0,0 +1,75 @@
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+## state shared by every job of a pool, sent once per worker instead of once per job
+_shared=None
+
+def _init_worker(shared):
+	global _shared
+	_shared=shared
+
+def job_seed(seed, loop_index, job_index=None):
+	## deterministic and independent of which worker runs the job or in what order
+	key=[seed, loop_index] if job_index is None else [seed, loop_index, job_index]
+	return int(np.random.SeedSequence(key).generate_state(1)[0])
+
+def default_outputs(result):
+	## every run() returns cumulative regret first and learning error second
+	return {'regret': np.asarray(result[0]), 'error': np.asarray(result[1])}
+
+def run_job(setup, build, outputs, seed, loop_index, job_index):
+	## the loop's problem is rebuilt from the loop seed, so every algorithm of a loop sees the same one
+	np.random.seed(job_seed(seed, loop_index))
+	problem=setup(loop_index, _shared)
+	np.random.seed(job_seed(seed, loop_index, job_index))
+	model=build(problem)
+	result=model.run(problem['user_seq'], problem['item_pool_seq'], problem['iteration'])
+	return outputs(result)
+
+
+class ExperimentRunner():
+	## fans (loop x algorithm) jobs out to a process pool and gathers (loop, iteration) matrices
+	## setup(loop_index, shared) returns a problem dict with user_seq, item_pool_seq and iteration
+	## algorithms maps a name to build(problem) -> model, all module-level so they can be pickled
+	def __init__(self, setup, algorithms, loop, seed=0, processes=None, shared=None, outputs=None):
+		self.setup=setup
+		self.algorithms=algorithms
+		self.names=list(algorithms)
+		self.loop=loop
+		self.seed=seed
+		self.processes=os.cpu_count() if processes is None else processes
+		self.shared=shared
+		if outputs is None:
+			outputs={}
+		self.outputs={name: outputs.get(name, default_outputs) for name in self.names}
+
+	def jobs(self):
+		return [(l, j) for l in range(self.loop) for j in range(len(self.names))]
+
+	def run(self):
+		results={name: {} for name in self.names}
+		if self.processes==1:
+			_init_worker(self.shared)
+			for l, j in self.jobs():
+				self.gather(results, l, j, run_job(self.setup, self.algorithms[self.names[j]], self.outputs[self.names[j]], self.seed, l, j))
+			return results
+		with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker, initargs=(self.shared,)) as pool:
+			futures={}
+			for l, j in self.jobs():
+				name=self.names[j]
+				futures[(l, j)]=pool.submit(run_job, self.setup, self.algorithms[name], self.outputs[name], self.seed, l, j)
+			for (l, j), future in futures.items():
+				self.gather(results, l, j, future.result())
+		return results
+
+	def gather(self, results, loop_index, job_index, output):
+		matrices=results[self.names[job_index]]
+		for key, value in output.items():
+			if key not in matrices:
+				matrices[key]=np.zeros((self.loop,)+np.shape(value))
+			matrices[key][loop_index]=value
+
+	def matrices(self, results):
+		## the drivers' naming: linucb_regret_matrix, gob_error_matrix, ...
+		return {'%s_%s_matrix'%(name, key): value for name in results for key, value in results[name].items()}
@@ -3,9 +3,14 @@ from sklearn.metrics.pairwise import rbf_kernel
 from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
+from linalg_utils import score_pool, refreshed_inverse_update, ConfidenceState
+from environment import Environment
+import instrumentation
+from user_state import UserState
+from graph_operator import KronInvSqrt
 
 class GOB():
-	def __init__(self, dimension,iteration, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, b, state):
+	def __init__(self, dimension,iteration, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, b, state, user_state_path=None, rank=None, refresh=100):
 		self.true_adj=true_adj
 		self.state=state
 		self.dimension=dimension
@@ -16,123 +21,146 @@ class GOB():
 		self.item_feature_matrix=item_feature_matrix
 		self.true_user_feature_matrix=true_user_feature_matrix
 		self.true_payoffs=true_payoffs
+		self.environment=None
 		self.true_user_feature_vector=true_user_feature_matrix.flatten()
 		self.user_feature_vector=np.zeros(self.user_num*self.dimension)
 		self.user_feature_matrix=np.zeros((self.user_num, self.dimension))
 		self.user_feature_matrix_converted=np.zeros((self.user_num, self.dimension))
 		self.user_ridge=np.zeros((self.user_num, self.dimension))
 		self.user_ls=np.zeros((self.user_num, self.dimension))
-		self.I=np.identity(self.user_num*self.dimension)
 		self.adj=true_adj
 		self.lap=true_lap
 		self.L=self.lap.copy()+np.identity(self.user_num)
-		self.A=np.kron(self.L, np.identity(self.dimension))
-		self.A_inv=np.linalg.pinv(self.A)
-		self.A_inv_sqrt=scipy.linalg.sqrtm(self.A_inv)
+		self.A_inv_sqrt=KronInvSqrt(self.L, rank=rank, degree=np.sum(self.adj, axis=1))
 		self.alpha=alpha
 		self.delta=delta
 		self.sigma=sigma
 		self.beta=0
+		self.x_norm=0
+		self.ucb=0
 		self.b=b
 		self.covariance=np.identity(self.user_num*self.dimension)
+		self.cov_inv=np.identity(self.user_num*self.dimension)
+		self.conf=ConfidenceState(None, logdet=0.0)
+		self.refresh=refresh
+		self.update_counter=0
 		self.bias=np.zeros(self.user_num*self.dimension)
 		self.beta_list=[]
 		self.graph_error=[]
-		self.user_xx={}
-		self.user_v={}
-		self.user_bias={}
-		self.user_counter={}
+		self.users=UserState(self.user_num, self.dimension, path=user_state_path)
+		self.user_xx=self.users.add_matrix('user_xx')
+		self.user_v=self.users.add_matrix('user_v')
+		self.user_bias=self.users.add_vector('user_bias')
+		self.user_counter=self.users.add_counter('user_counter')
 		self.real_beta_list=[]
+		self.user_blocks={}
 
 	def initial(self):
-		for u in range(self.user_num):
-			self.user_xx[u]=np.zeros((self.dimension, self.dimension))
-			self.user_v[u]=self.alpha*np.identity(self.dimension)
-			self.user_bias[u]=np.zeros(self.dimension)
-			self.user_counter[u]=0
+		self.users.reset('user_xx')
+		self.users.set_identity('user_v', self.alpha)
+		self.users.reset('user_bias')
+		self.users.reset('user_counter')
+
+	def user_block(self, user_index):
+		## column block A^{-1/2}[:, user] is c kron I, only c is cached
+		if user_index not in self.user_blocks:
+			self.user_blocks[user_index]=self.A_inv_sqrt.column(user_index)
+		return self.user_blocks[user_index]
+
+	def project(self, user_index, cov_inv):
+		## co_x=(c kron I)x, so x^T P x and x^T m give the nd-space width and mean
+		c=self.user_block(user_index)
+		n, d=self.user_num, self.dimension
+		proj_cov_inv=np.einsum('a,aibj,b->ij', c, cov_inv.reshape((n, d, n, d)), c, optimize=True)
+		proj_mean=np.dot(c, self.user_feature_matrix)
+		return proj_mean, proj_cov_inv
 
 	def update_beta(self):
-		a=np.linalg.det(self.covariance)
 		#b=np.linalg.det(self.alpha*self.A)**(-1/2)
-		self.beta=self.sigma*np.sqrt(np.log(a/self.delta))+np.sqrt(self.alpha)*np.linalg.norm(np.dot(np.real(self.A_inv_sqrt), self.user_feature_vector))
+		self.beta=self.sigma*np.sqrt(self.conf.logdet-np.log(self.delta))+np.sqrt(self.alpha)*np.linalg.norm(self.A_inv_sqrt.apply(self.user_feature_matrix))
 		self.beta_list.extend([self.beta])
 		diff=self.user_feature_vector-self.true_user_feature_vector
 		real_beta=np.sqrt(np.dot(np.dot(diff, self.covariance), diff))
 		self.real_beta_list.extend([real_beta])
 		
-	def select_item(self, item_pool, user_index, time):
-		item_fs=self.item_feature_matrix[item_pool]
-		item_feature_array=np.zeros((self.pool_size, self.user_num*self.dimension))
-		item_feature_array[:,user_index*self.dimension:(user_index+1)*self.dimension]=item_fs
-		estimated_payoffs=np.zeros(self.pool_size)
-		cov_inv=np.linalg.pinv(self.covariance)
+	def start(self):
+		self.initial()
+
+	def select(self, item_fs, user_index, time):
+		## pool index of the chosen arm, the select/update protocol shared with LockstepSimulator
+		self.user_counter[user_index]+=1
+		cov_inv=self.cov_inv
+		proj_mean, proj_cov_inv=self.project(user_index, cov_inv)
 		if self.state==False:
 			self.update_beta()
-			for j in range(self.pool_size):
-				item_index=item_pool[j]
-				x=self.item_feature_matrix[item_index]
-				x_long=np.zeros((self.dimension*self.user_num))
-				x_long[user_index*self.dimension:(user_index+1)*self.dimension]=x
-				co_x=np.dot(self.A_inv_sqrt, x_long)
-				x_norm=np.sqrt(np.dot(np.dot(co_x, cov_inv), co_x))
-				self.beta=0.1*np.sqrt(np.log(time+1))
-				est_y=np.dot(self.user_feature_vector, co_x)+self.beta*x_norm
-				estimated_payoffs[j]=est_y
-				ucb=self.beta_list[time]*x_norm
+			self.beta=0.1*np.sqrt(np.log(time+1))
+			max_index, means, x_norms=score_pool(item_fs, proj_mean, proj_cov_inv, self.beta)
+			self.x_norm=x_norms[-1]
+			self.ucb=self.beta_list[time]*self.x_norm
 		else: 
-			for j in range(self.pool_size):
-				item_index=item_pool[j]
-				x=self.item_feature_matrix[item_index]
-				x_long=np.zeros((self.dimension*self.user_num))
-				x_long[user_index*self.dimension:(user_index+1)*self.dimension]=x
-				co_x=np.dot(np.real(self.A_inv_sqrt), x_long)
-				x_norm=np.sqrt(np.dot(np.dot(co_x, cov_inv),co_x))
-				est_y=np.dot(self.user_feature_vector, co_x)+self.beta*x_norm*np.sqrt(np.log(time+1))
-				estimated_payoffs[j]=est_y
-
-		max_index=np.argmax(estimated_payoffs)
+			max_index, means, x_norms=score_pool(item_fs, proj_mean, proj_cov_inv, self.beta*np.sqrt(np.log(time+1)))
+			self.x_norm=x_norms[-1]
+			self.ucb=self.beta*self.x_norm*np.sqrt(np.log(time+1))
+		return max_index
+
+	def update(self, true_payoff, selected_item_feature, user_index, time):
+		self.update_user_feature(true_payoff, selected_item_feature, user_index)
+
+	def learning_error(self):
+		return np.linalg.norm(self.user_feature_matrix_converted.flatten()-self.true_user_feature_vector)
+
+	def select_item(self, item_pool, user_index, time):
+		item_fs=self.item_feature_matrix[item_pool]
+		max_index=self.select(item_fs, user_index, time)
+		x_norm, ucb=self.x_norm, self.ucb
+
 		selected_item_index=item_pool[max_index]
 		selected_item_feature=item_fs[max_index]
 		true_payoff=self.true_payoffs[user_index, selected_item_index]+np.random.normal(scale=self.sigma)
-		max_ideal_payoff=np.max(self.true_payoffs[user_index][item_pool])
+		max_ideal_payoff=self.environment.best_payoffs[time]
 		regret=max_ideal_payoff-true_payoff
 		return true_payoff, selected_item_feature, regret, x_norm, ucb
 
 	def update_user_feature(self, true_payoff, selected_item_feature, user_index):
-		x_long=np.zeros(self.dimension*self.user_num)
-		x_long[user_index*self.dimension:(user_index+1)*self.dimension]=selected_item_feature
-		co_x=np.dot(np.real(self.A_inv_sqrt), x_long)
+		co_x=np.outer(self.user_block(user_index), selected_item_feature).flatten()
 		self.user_xx[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_v[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_bias[user_index]+=true_payoff*selected_item_feature
+		self.conf.update(co_x, self.cov_inv)
 		self.covariance+=np.outer(co_x, co_x)
 		self.bias+=true_payoff*co_x
-		cov_inv=np.linalg.pinv(self.covariance)
-		self.user_feature_vector=np.dot(cov_inv, self.bias)
+		self.update_counter+=1
+		refreshed_inverse_update(self.cov_inv, self.covariance, co_x, self.update_counter, self.refresh)
+		self.user_feature_vector=np.dot(self.cov_inv, self.bias)
 		self.user_feature_matrix=self.user_feature_vector.reshape((self.user_num, self.dimension))
-		self.user_feature_matrix_converted=np.dot(np.real(self.A_inv_sqrt),self.user_feature_vector).reshape((self.user_num, self.dimension))
+		self.user_feature_matrix_converted=self.A_inv_sqrt.apply(self.user_feature_matrix)
 
 
-	def run(self, user_array, item_pool_array, iteration):
+	def run(self, user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		self.environment=environment
 		cumulative_regret=[0]
 		learning_error_list=np.zeros(iteration)
 		x_norm_list=[]
 		sum_x_norm=[0]
 		ucb_list=[]
-		self.initial()		
+		self.start()
 		for time in range(iteration):	
 			print('time/iteration', time, iteration, '~~~GOB')
 			user_index=user_array[time]
 			item_pool=item_pool_array[time]
-			self.user_counter[user_index]+=1
 			true_payoff, selected_item_feature, regret, x_norm, ucb=self.select_item(item_pool, user_index, time)
 			x_norm_list.extend([x_norm])
 			ucb_list.extend([ucb])
-			self.update_user_feature(true_payoff, selected_item_feature, user_index)
+			self.update(true_payoff, selected_item_feature, user_index, time)
 			cumulative_regret.extend([cumulative_regret[-1]+regret])
-			error=np.linalg.norm(self.user_feature_matrix_converted.flatten()-self.true_user_feature_vector)
+			error=self.learning_error()
 			learning_error_list[time]=error
 			sum_x_norm.extend([sum_x_norm[-1]+x_norm])
 
 
+		self.users.flush()
 		return np.array(cumulative_regret[1:]), learning_error_list, self.beta_list, x_norm_list, ucb_list, sum_x_norm[1:], self.real_beta_list
+
+instrumentation.register(GOB, ['update_beta', 'select_item', 'update_user_feature'])
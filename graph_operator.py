@@ -0,0 +1,67 @@
+import numpy as np
+import scipy.linalg
+from scipy.sparse import issparse, csr_matrix
+from scipy.sparse.linalg import eigsh
+
+class KronInvSqrt():
+	## (L kron I)^{-1/2}=L^{-1/2} kron I, only the n x n factor is kept
+	## a random-walk L=D^{-1/2}SD^{1/2} is handled through the symmetric S when degree is given
+	def __init__(self, L, rank=None, degree=None):
+		self.user_num=L.shape[0]
+		self.rank=rank
+		if issparse(L):
+			L=csr_matrix(L)
+		self.scale=np.ones(self.user_num)
+		if not self.is_symmetric(L) and degree is not None:
+			scale=np.sqrt(np.asarray(degree, dtype=float))
+			scale[scale==0]=1.0
+			if issparse(L):
+				S=csr_matrix(L.multiply(scale[:,None]).multiply(1.0/scale[None,:]))
+			else:
+				S=scale[:,None]*L/scale[None,:]
+			if self.is_symmetric(S, tol=1e-10):
+				L=(S+S.T)/2
+				self.scale=scale
+		symmetric=self.is_symmetric(L)
+		if rank is None:
+			if issparse(L):
+				L=L.toarray()
+			if symmetric:
+				w, V=np.linalg.eigh(L)
+				self.M=np.dot(V/np.sqrt(w), V.T)
+			else:
+				self.M=np.real(scipy.linalg.sqrtm(np.linalg.pinv(L)))
+		else:
+			if not symmetric:
+				raise ValueError('low-rank KronInvSqrt needs a symmetric or degree-symmetrisable Laplacian')
+			L=csr_matrix(L)
+			w, V=eigsh(L, k=rank, sigma=0, which='LM')
+			## the discarded eigenvalues are replaced by their mean
+			rest=(L.diagonal().sum()-np.sum(w))/max(self.user_num-rank, 1)
+			self.c=1.0/np.sqrt(rest)
+			self.w=w
+			self.V=V
+			self.M=None
+
+	def is_symmetric(self, L, tol=0.0):
+		if issparse(L):
+			diff=abs(L-L.T)
+			return diff.nnz==0 or diff.max()<=tol
+		return np.max(np.abs(L-L.T))<=tol
+
+	def column(self, user_index):
+		if self.M is not None:
+			col=self.M[:, user_index].copy()
+		else:
+			col=np.dot(self.V, (1.0/np.sqrt(self.w)-self.c)*self.V[user_index])
+			col[user_index]+=self.c
+		return col*self.scale[user_index]/self.scale
+
+	def apply(self, U):
+		## U is (user_num, dimension), i.e. a reshaped nd vector
+		U=U*self.scale[:,None]
+		if self.M is not None:
+			out=np.dot(self.M, U)
+		else:
+			out=np.dot(self.V, ((1.0/np.sqrt(self.w)-self.c)[:,None])*np.dot(self.V.T, U))+self.c*U
+		return out/self.scale[:,None]
@@ -0,0 +1,85 @@
+import numpy as np
+import time
+import json
+
+## model classes register the methods worth timing, they are only wrapped while instrumentation is on,
+## so a disabled run executes the original methods and the original numpy.linalg functions
+_registry={}
+_linalg_names=['inv', 'pinv', 'det', 'slogdet', 'eig', 'eigh', 'eigvalsh']
+_originals={}
+timings={}
+linalg_sizes={}
+
+
+def register(cls, methods):
+	_registry[cls]=list(methods)
+
+def enabled():
+	return len(_originals)>0
+
+def _timed(key, method):
+	def wrapper(*args, **kwargs):
+		start=time.perf_counter()
+		try:
+			return method(*args, **kwargs)
+		finally:
+			timings.setdefault(key, []).append(time.perf_counter()-start)
+	wrapper.__wrapped__=method
+	return wrapper
+
+def _counted(name, function):
+	def wrapper(a, *args, **kwargs):
+		## trailing dimension of the (possibly stacked) matrix, one entry per call
+		linalg_sizes.setdefault(name, []).append(np.shape(a)[-1] if np.ndim(a)>0 else 0)
+		return function(a, *args, **kwargs)
+	wrapper.__wrapped__=function
+	return wrapper
+
+def enable():
+	if enabled():
+		return
+	for cls, methods in _registry.items():
+		for name in methods:
+			method=cls.__dict__[name]
+			_originals[(cls, name)]=method
+			setattr(cls, name, _timed('%s.%s'%(cls.__name__, name), method))
+	for name in _linalg_names:
+		function=getattr(np.linalg, name)
+		_originals[(np.linalg, name)]=function
+		setattr(np.linalg, name, _counted(name, function))
+
+def disable():
+	for (owner, name), original in _originals.items():
+		setattr(owner, name, original)
+	_originals.clear()
+
+def reset():
+	timings.clear()
+	linalg_sizes.clear()
+
+def summary():
+	## per method: calls, total/mean/max seconds; per linalg call: count and largest matrix
+	report={'timings': {}, 'linalg': {}}
+	for key, values in timings.items():
+		values=np.array(values)
+		report['timings'][key]={'calls': len(values), 'total': float(np.sum(values)), 'mean': float(np.mean(values)), 'max': float(np.max(values))}
+	for name, sizes in linalg_sizes.items():
+		report['linalg'][name]={'calls': len(sizes), 'max_size': int(np.max(sizes)), 'mean_size': float(np.mean(sizes))}
+	return report
+
+def histograms(bins=20):
+	## log-spaced duration histograms per method and matrix size histograms per linalg function
+	report={'timings': {}, 'linalg': {}}
+	for key, values in timings.items():
+		values=np.maximum(np.array(values), 1e-9)
+		edges=np.logspace(np.log10(values.min()), np.log10(values.max())+1e-12, bins+1)
+		counts, edges=np.histogram(values, bins=edges)
+		report['timings'][key]={'counts': counts.tolist(), 'edges': edges.tolist()}
+	for name, sizes in linalg_sizes.items():
+		counts, edges=np.histogram(sizes, bins=min(bins, len(np.unique(sizes))))
+		report['linalg'][name]={'counts': counts.tolist(), 'edges': edges.tolist()}
+	return report
+
+def export(path, bins=20):
+	with open(path, 'w') as f:
+		json.dump({'summary': summary(), 'histograms': histograms(bins)}, f, indent=1)
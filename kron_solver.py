@@ -0,0 +1,135 @@
+import numpy as np
+from scipy.sparse import csr_matrix, kron, identity, block_diag
+from scipy.sparse.linalg import spsolve
+
+class KronLaplacianSystem():
+	## (alpha*(L kron I)+shift*I+blockdiag(X_u^T X_u)) theta=b, kept as an n x n graph plus n dxd blocks
+	def __init__(self, L, dimension, alpha, tol=1e-10, max_iter=300, shift=0.0):
+		self.user_num=L.shape[0]
+		self.dimension=dimension
+		self.alpha=alpha
+		self.tol=tol
+		## a fixed cap, a solve that stalls falls back to direct_solve instead of iterating ~nd times
+		self.max_iter=max_iter
+		self.shift=shift
+		self.XX=np.zeros((self.user_num, self.dimension, self.dimension))
+		self.bias=np.zeros((self.user_num, self.dimension))
+		self.theta=np.zeros((self.user_num, self.dimension))
+		self.precond=np.zeros((self.user_num, self.dimension, self.dimension))
+		self.active=[]
+		self.iteration_list=[]
+		self.set_laplacian(L)
+
+	def set_laplacian(self, L):
+		self.L=csr_matrix(L)
+		self.symmetric=abs(self.L-self.L.T).max()==0
+		self.L_diag=self.L.diagonal()
+		self.refresh_precond()
+
+	def set_shift(self, shift):
+		## the block-Jacobi preconditioner only needs to be close, so it follows large shift changes only
+		self.shift=shift
+		if abs(shift-self.precond_shift)>0.1*max(abs(self.precond_shift), 1.0):
+			self.refresh_precond()
+
+	def refresh_precond(self):
+		self.precond_shift=self.shift
+		diag=np.arange(self.dimension)
+		blocks=self.XX.copy()
+		blocks[:, diag, diag]+=(self.alpha*self.L_diag+self.shift)[:,None]
+		self.precond=np.linalg.inv(blocks)
+
+	def add(self, user_index, x, y):
+		if not self.XX[user_index].any():
+			self.active.extend([user_index])
+		self.XX[user_index]+=np.outer(x, x)
+		self.bias[user_index]+=y*x
+		self.precond[user_index]=np.linalg.inv((self.alpha*self.L_diag[user_index]+self.precond_shift)*np.identity(self.dimension)+self.XX[user_index])
+
+	def matvec(self, V):
+		out=self.alpha*(self.L@V)
+		if self.shift!=0:
+			out+=self.shift*V
+		active=self.active
+		out[active]+=np.einsum('uij,uj->ui', self.XX[active], V[active])
+		return out
+
+	def apply_precond(self, R):
+		return np.einsum('uij,uj->ui', self.precond, R)
+
+	def solve(self, rhs=None):
+		## without rhs, solves for the accumulated bias warm-started from the last theta
+		if rhs is None:
+			b, theta=self.bias, self.theta
+		else:
+			b, theta=rhs, np.zeros_like(rhs)
+		if self.symmetric:
+			theta, converged, it=self.pcg(theta, b)
+		else:
+			theta, converged, it=self.bicgstab(theta, b)
+		if not converged:
+			theta=self.direct_solve(b)
+		self.iteration_list.extend([it])
+		if rhs is None:
+			self.theta=theta
+		return theta
+
+	def direct_solve(self, b):
+		M=self.alpha*kron(self.L, identity(self.dimension))+self.shift*identity(self.user_num*self.dimension)+block_diag(list(self.XX))
+		return spsolve(csr_matrix(M), b.flatten()).reshape((self.user_num, self.dimension))
+
+	def pcg(self, theta, b):
+		b_norm=np.linalg.norm(b)
+		if b_norm==0:
+			return np.zeros_like(theta), True, 0
+		theta=theta.copy()
+		r=b-self.matvec(theta)
+		z=self.apply_precond(r)
+		p=z.copy()
+		rz=np.sum(r*z)
+		for it in range(self.max_iter):
+			if np.linalg.norm(r)<=self.tol*b_norm:
+				return theta, True, it
+			Ap=self.matvec(p)
+			step=rz/np.sum(p*Ap)
+			theta+=step*p
+			r-=step*Ap
+			z=self.apply_precond(r)
+			rz_new=np.sum(r*z)
+			p=z+(rz_new/rz)*p
+			rz=rz_new
+		return theta, np.linalg.norm(r)<=self.tol*b_norm, self.max_iter
+
+	def bicgstab(self, theta, b):
+		b_norm=np.linalg.norm(b)
+		if b_norm==0:
+			return np.zeros_like(theta), True, 0
+		theta=theta.copy()
+		r=b-self.matvec(theta)
+		r_hat=r.copy()
+		rho=alpha=omega=1.0
+		v=np.zeros_like(r)
+		p=np.zeros_like(r)
+		for it in range(self.max_iter):
+			if np.linalg.norm(r)<=self.tol*b_norm:
+				return theta, True, it
+			rho_new=np.sum(r_hat*r)
+			if rho_new==0 or omega==0:
+				break
+			p=r+(rho_new/rho)*(alpha/omega)*(p-omega*v)
+			p_hat=self.apply_precond(p)
+			v=self.matvec(p_hat)
+			alpha=rho_new/np.sum(r_hat*v)
+			s=r-alpha*v
+			s_hat=self.apply_precond(s)
+			t=self.matvec(s_hat)
+			tt=np.sum(t*t)
+			if tt==0:
+				theta+=alpha*p_hat
+				r=s
+				continue
+			omega=np.sum(t*s)/tt
+			theta+=alpha*p_hat+omega*s_hat
+			r=s-omega*t
+			rho=rho_new
+		return theta, np.linalg.norm(r)<=self.tol*b_norm, self.max_iter
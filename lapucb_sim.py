@@ -1,12 +1,16 @@
 import numpy as np 
 from sklearn.metrics.pairwise import rbf_kernel
 from sklearn.preprocessing import Normalizer, MinMaxScaler
-from scipy.sparse import csgraph 
+from scipy.sparse import csgraph, csr_matrix
 import scipy
 import os 
+from linalg_utils import refreshed_inverse_update, score_pool, ConfidenceState
+from environment import Environment
+import instrumentation
+from user_state import UserState, LaplacianUserCache
 
-class LAPUCB_SIM(): 
-	def __init__(self, dimension,iteration, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, beta, thres, state):
+class LAPUCB_SIM(LaplacianUserCache): 
+	def __init__(self, dimension,iteration, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, beta, thres, state, user_state_path=None, refresh=100):
 		self.true_adj=true_adj
 		self.state=state
 		self.dimension=dimension
@@ -17,98 +21,121 @@ class LAPUCB_SIM():
 		self.item_feature_matrix=item_feature_matrix
 		self.true_user_feature_matrix=true_user_feature_matrix
 		self.true_payoffs=true_payoffs
+		self.environment=None
 		self.user_feature_matrix=np.zeros((self.user_num, self.dimension))
 		self.thres=thres
 		self.adj=true_adj
 		self.lap=true_lap
 		self.L=self.lap.copy()+0.01*np.identity(self.user_num)
+		self.L_csr=csr_matrix(self.L)
+		self.L_csc=self.L_csr.tocsc()
 		self.alpha=alpha
 		self.delta=delta
 		self.sigma=sigma
 		self.beta=beta
-		self.user_bias={}
-		self.user_v={}
-		self.user_xx={}
-		self.user_avg={}
+		self.x_norm=0
+		self.users=UserState(self.user_num, self.dimension, path=user_state_path)
+		self.user_bias=self.users.add_vector('user_bias')
+		self.user_v=self.users.add_matrix('user_v')
+		self.user_v_inv=self.users.add_matrix('user_v_inv')
+		self.user_update_counter=self.users.add_counter('user_update_counter')
+		self.refresh=refresh
+		self.user_conf=None
+		self.user_xx=self.users.add_matrix('user_xx')
+		self.user_xx_inv=self.users.add_matrix('user_xx_inv')
+		self.user_xx_inv_valid=self.users.add_flag('user_xx_inv_valid')
+		self.user_avg=self.users.add_vector('user_avg')
+		self.user_avg_dirty=self.users.add_flag('user_avg_dirty')
 		self.user_ridge=np.zeros((self.user_num, self.dimension))
 		self.user_ls=np.zeros((self.user_num, self.dimension))
 		self.beta_list=[]
-		self.user_counter={}
+		self.user_counter=self.users.add_counter('user_counter')
 		self.graph_error=[]
-		self.user_h={}
+		self.user_h=self.users.add_matrix('user_h')
 
 	def initialized_parameter(self):
-		for u in range(self.user_num):
-			self.user_v[u]=self.alpha*np.identity(self.dimension)
-			self.user_avg[u]=np.zeros(self.dimension)
-			self.user_xx[u]=0.1*np.identity(self.dimension)
-			self.user_bias[u]=np.zeros(self.dimension)
-			self.user_counter[u]=0
-			self.user_h[u]=np.zeros((self.dimension, self.dimension))
+		self.users.set_identity('user_v', self.alpha)
+		self.users.set_identity('user_v_inv', 1/self.alpha)
+		self.users.reset('user_update_counter')
+		self.user_conf=ConfidenceState(self.alpha*np.identity(self.dimension), user_num=self.user_num)
+		self.users.reset('user_avg')
+		self.users.reset('user_avg_dirty')
+		self.users.set_identity('user_xx', 0.1)
+		self.users.reset('user_xx_inv_valid')
+		self.users.reset('user_bias')
+		self.users.reset('user_counter')
+		self.users.reset('user_h')
 
 	def update_beta(self, user_index):
-		sum_A=np.zeros((self.dimension, self.dimension))
-		for uu in range(self.user_num):
-			if uu==user_index:
-				pass
-			else:
-				sum_A+=((self.L[user_index, uu])**2)*np.linalg.inv(self.user_xx[uu])
+		start, end=self.L_csr.indptr[user_index], self.L_csr.indptr[user_index+1]
+		neighbors=self.L_csr.indices[start:end]
+		weights=self.L_csr.data[start:end]
+		mask=neighbors!=user_index
+		sum_A=np.einsum('u,uij->ij', weights[mask]**2, self.get_user_xx_inv(neighbors[mask]))
 		self.user_h[user_index]=self.user_xx[user_index]+self.alpha**2*sum_A+2*self.alpha*self.L[user_index, user_index]*np.identity(self.dimension)
-		a=np.linalg.det(self.user_v[user_index])**(1/2)
-		b=np.linalg.det(self.alpha*np.identity(self.dimension))**(-1/2)
-		d=self.sigma*np.sqrt(2*np.log(a*b/self.delta))
-		if self.user_counter[user_index]==0:
-			if self.state==1:
-				self.user_avg[user_index]=np.dot(self.user_ls.T, self.L[user_index])
-			else:
-				self.user_avg[user_index]=np.dot(self.true_user_feature_matrix.T, self.L[user_index])
+		d=self.user_conf.radius(self.sigma, self.delta, user_index)
+		if self.state==1:
+			self.get_user_avg(user_index)
 		else:
-			if self.state==1:
-				self.user_avg[user_index]=np.dot(self.user_ls.T, self.L[user_index])
-			else:
-				self.user_avg[user_index]=np.dot(self.true_user_feature_matrix.T, self.L[user_index])
+			self.user_avg[user_index]=np.dot(self.true_user_feature_matrix.T, self.L[user_index])
+			self.user_avg_dirty[user_index]=True
 		c=np.sqrt(self.alpha)*np.linalg.norm(self.user_avg[user_index])
 		self.beta=d+c
 		self.beta_list.extend([self.beta])
 
-	def select_item(self, item_pool, user_index, time):
-		item_fs=self.item_feature_matrix[item_pool]
-		estimated_payoffs=np.zeros(self.pool_size)
+	def start(self):
+		self.initialized_parameter()
+
+	def select(self, item_fs, user_index, time):
+		## pool index of the chosen arm, the select/update protocol shared with LockstepSimulator
 		self.update_beta(user_index)
 		h_inv=np.linalg.pinv(self.user_h[user_index])
-		for j in range(self.pool_size):
-			x=item_fs[j]
-			x_norm=np.sqrt(np.dot(np.dot(x, h_inv),x))
-			mean=np.dot(x, self.user_feature_matrix[user_index])
-			est_y=mean+self.beta*x_norm
-			estimated_payoffs[j]=est_y
-			ucb=self.beta*x_norm
+		max_index, means, x_norms=score_pool(item_fs, self.user_feature_matrix[user_index], h_inv, self.beta)
+		self.x_norm=x_norms[-1]
+		return max_index
+
+	def update(self, true_payoff, selected_item_feature, user_index, time):
+		self.user_counter[user_index]+=1
+		self.update_user_feature_upon_ridge(true_payoff, selected_item_feature, user_index)
+
+	def learning_error(self):
+		return np.linalg.norm(self.user_feature_matrix-self.true_user_feature_matrix)
+
+	def select_item(self, item_pool, user_index, time):
+		item_fs=self.item_feature_matrix[item_pool]
+		max_index=self.select(item_fs, user_index, time)
+		x_norm=self.x_norm
+		ucb=self.beta*x_norm
 
-		max_index=np.argmax(estimated_payoffs)
 		selected_item_index=item_pool[max_index]
 		selected_item_feature=item_fs[max_index]
 		true_payoff=self.true_payoffs[user_index, selected_item_index]+np.random.normal(scale=self.sigma)
-		max_ideal_payoff=np.max(self.true_payoffs[user_index][item_pool])
+		max_ideal_payoff=self.environment.best_payoffs[time]
 		regret=max_ideal_payoff-true_payoff
 		return true_payoff, selected_item_feature, regret, x_norm, ucb
 
 	def update_user_feature_upon_ridge(self, true_payoff, selected_item_feature, user_index):
 		x=selected_item_feature
 		self.user_xx[user_index]+=np.outer(x, x)
+		self.user_xx_inv_valid[user_index]=False
+		self.user_conf.update(x, self.user_v_inv[user_index], user_index)
 		self.user_v[user_index]+=np.outer(x, x)
+		self.user_update_counter[user_index]+=1
+		refreshed_inverse_update(self.user_v_inv[user_index], self.user_v[user_index], x, self.user_update_counter[user_index], self.refresh)
 		self.user_bias[user_index]+=true_payoff*x
-		xx_inv=np.linalg.pinv(self.user_xx[user_index])
-		v_inv=np.linalg.pinv(self.user_v[user_index])
+		xx_inv=self.get_user_xx_inv(np.array([user_index]))[0]
+		v_inv=self.user_v_inv[user_index]
 		self.user_ls[user_index]=np.dot(xx_inv, self.user_bias[user_index])
 		self.user_ridge[user_index]=np.dot(v_inv, self.user_bias[user_index])
-		for u in range(self.user_num):
-			v_inv=np.linalg.pinv(self.user_v[u])
-			xx_inv=np.linalg.pinv(self.user_xx[u])
-			self.user_avg[u]=np.dot(self.user_ls.T, self.L[u])
-			self.user_feature_matrix[u]=self.user_ls[u]-self.alpha*np.dot(v_inv, self.user_avg[u])
+		dirty=np.union1d(self.mark_user_avg_dirty(user_index), [user_index])
+		for u in dirty:
+			self.user_feature_matrix[u]=self.user_ls[u]-self.alpha*np.dot(self.user_v_inv[u], self.get_user_avg(u))
 
-	def run(self, user_array, item_pool_array, iteration):
-		self.initialized_parameter()
+	def run(self, user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		self.environment=environment
+		self.start()
 		cumulative_regret=[0]
 		learning_error_list=np.zeros(iteration)
 		x_norm_list=[]
@@ -122,13 +149,15 @@ class LAPUCB_SIM():
 			item_pool=item_pool_array[time]
 			true_payoff, selected_item_feature, regret, x_norm, ucb=self.select_item(item_pool,user_index, time)
 			x_norm_list.extend([x_norm])
-			self.user_counter[user_index]+=1
-			self.update_user_feature_upon_ridge(true_payoff, selected_item_feature, user_index)
-			error=np.linalg.norm(self.user_feature_matrix-self.true_user_feature_matrix)
+			self.update(true_payoff, selected_item_feature, user_index, time)
+			error=self.learning_error()
 			cumulative_regret.extend([cumulative_regret[-1]+regret])
 			learning_error_list[time]=error 
 			inst_regret.extend([regret])
 			ucb_list.extend([ucb])
 			sum_x_norm.extend([sum_x_norm[-1]+x_norm])
 
+		self.users.flush()
 		return np.array(cumulative_regret[1:]), learning_error_list, self.beta_list, x_norm_list, avg_norm_list,inst_regret, ucb_list, sum_x_norm[1:]
+
+instrumentation.register(LAPUCB_SIM, ['update_beta', 'select_item', 'update_user_feature_upon_ridge'])
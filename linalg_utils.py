@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def sherman_morrison_update(inv, x):
+	## inverse of (M+xx^T) from the inverse of M, in place
+	inv_x=np.dot(inv, x)
+	denom=1.0+np.dot(x, inv_x)
+	inv-=np.outer(inv_x, inv_x)/denom
+	return inv
+
+
+def refreshed_inverse_update(inv, cov, x, count, refresh):
+	## Sherman-Morrison step, or an exact inverse every refresh updates to bound drift
+	## cov must already include xx^T
+	if count%refresh==0:
+		inv[:]=np.linalg.inv(cov)
+	else:
+		sherman_morrison_update(inv, x)
+	return inv
+
+
+def cholesky_rank_one_update(chol, x):
+	## lower factor of LL^T+xx^T from L, in place, O(d^2)
+	x=np.array(x, dtype=float)
+	d=len(x)
+	for k in range(d):
+		r=np.hypot(chol[k, k], x[k])
+		c=r/chol[k, k]
+		s=x[k]/chol[k, k]
+		chol[k, k]=r
+		if k+1<d:
+			chol[k+1:, k]=(chol[k+1:, k]+s*x[k+1:])/c
+			x[k+1:]=c*x[k+1:]-s*chol[k+1:, k]
+	return chol
+
+
+def batched_lower_transpose_solve(chol, z):
+	## solves L_m^T y_m=z_m for a stack of lower factors by back substitution across all m at once
+	y=np.zeros_like(z)
+	d=z.shape[1]
+	for i in range(d-1, -1, -1):
+		y[:, i]=(z[:, i]-np.einsum('mj,mj->m', chol[:, i+1:, i], y[:, i+1:]))/chol[:, i, i]
+	return y
+
+
+class ConfidenceState():
+	def __init__(self, cov, logdet_0=None, user_num=None, logdet=None):
+		## with user_num, one log-determinant per user, all starting from cov
+		## a known logdet skips the slogdet of cov (e.g. identity nd x nd)
+		if logdet is None:
+			logdet=np.linalg.slogdet(cov)[1]
+		if logdet_0 is None:
+			self.logdet_0=logdet
+		else:
+			self.logdet_0=logdet_0
+		if user_num is None:
+			self.logdet=logdet
+		else:
+			self.logdet=np.full(user_num, logdet)
+
+	def update(self, x, cov_inv, index=None):
+		## matrix determinant lemma, cov_inv is the inverse before adding xx^T
+		step=np.log1p(np.dot(np.dot(x, cov_inv), x))
+		if index is None:
+			self.logdet+=step
+		else:
+			self.logdet[index]+=step
+
+	def reset(self, cov, index=None, logdet_0=None):
+		## logdet_0 moves the reference V_0 too, for models whose prior changes between rounds
+		if logdet_0 is not None:
+			self.logdet_0=logdet_0
+		if index is None:
+			self.logdet=np.linalg.slogdet(cov)[1]
+		else:
+			self.logdet[index]=np.linalg.slogdet(cov)[1]
+
+	def radius(self, sigma, delta, index=None):
+		## sigma*sqrt(2*log(det(V)^{1/2}*det(V_0)^{-1/2}/delta))
+		if index is None:
+			logdet=self.logdet
+		else:
+			logdet=self.logdet[index]
+		return sigma*np.sqrt(2*(0.5*(logdet-self.logdet_0)-np.log(delta)))
+
+
+def score_pool(item_fs, theta, cov_inv, beta):
+	## UCB scores of a whole pool: returns argmax, means and widths x^T M^{-1} x
+	means=np.dot(item_fs, theta)
+	if cov_inv is None:
+		widths=np.zeros(item_fs.shape[0])
+	else:
+		widths=np.sqrt(np.maximum(np.sum(np.dot(item_fs, cov_inv)*item_fs, axis=1), 0.0))
+	payoffs=means+beta*widths
+	return np.argmax(payoffs), means, widths
@@ -4,9 +4,13 @@ from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
 import os 
+from linalg_utils import sherman_morrison_update, score_pool, ConfidenceState
+from environment import Environment
+import instrumentation
+from user_state import UserState
 
 class LINUCB():
-	def __init__(self, dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, delta, sigma, state):
+	def __init__(self, dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, delta, sigma, state, refresh=100, user_state_path=None):
 		self.state=state
 		self.dimension=dimension
 		self.iteration=iteration
@@ -16,50 +20,67 @@ class LINUCB():
 		self.item_feature_matrix=item_feature_matrix
 		self.true_user_feature_matrix=true_user_feature_matrix
 		self.true_payoffs=true_payoffs
+		self.environment=None
 		self.user_feature=np.zeros((self.user_num, self.dimension))
 		self.I=np.identity(self.dimension)
 		self.alpha=alpha
 		self.delta=delta
 		self.sigma=sigma
 		self.beta=0
-		self.user_cov={}
-		self.user_xx={}
-		self.user_bias={}
+		self.x_norm=0
+		self.refresh=refresh
+		self.users=UserState(self.user_num, self.dimension, path=user_state_path)
+		self.user_cov=self.users.add_matrix('user_cov')
+		self.user_cov_inv=self.users.add_matrix('user_cov_inv')
+		self.user_update_counter=self.users.add_counter('user_update_counter')
+		self.user_xx=self.users.add_matrix('user_xx')
+		self.user_bias=self.users.add_vector('user_bias')
+		self.user_conf=None
 		self.beta_list=[]
 		self.real_beta_list=[]
 
 	def initial_user_parameter(self):
-		for u in range(self.user_num):
-			self.user_cov[u]=self.alpha*np.identity(self.dimension)
-			self.user_xx[u]=0.01*np.identity(self.dimension)
-			self.user_bias[u]=np.zeros(self.dimension)
+		self.users.set_identity('user_cov', self.alpha)
+		self.users.set_identity('user_cov_inv', 1/self.alpha)
+		self.users.reset('user_update_counter')
+		self.users.set_identity('user_xx', 0.01)
+		self.users.reset('user_bias')
+		self.user_conf=ConfidenceState(self.alpha*self.I, user_num=self.user_num)
 
 	def update_beta(self, user_index, time):
-		a = np.linalg.det(self.user_cov[user_index])**(1/2)
-		b = np.linalg.det(self.alpha*self.I)**(-1/2)
-		self.beta=self.sigma*np.sqrt(2*np.log(a*b/self.delta))+np.sqrt(self.alpha)*np.linalg.norm(self.user_feature[user_index])
+		self.beta=self.user_conf.radius(self.sigma, self.delta, user_index)+np.sqrt(self.alpha)*np.linalg.norm(self.user_feature[user_index])
 		#self.beta=np.sqrt(self.alpha)+np.sqrt(2*np.log(1/self.delta)+self.dimension*np.log(1+time/(self.dimension*self.alpha)))
 		self.beta_list.extend([self.beta])
 		real_beta=np.sqrt(np.dot(np.dot(self.user_feature[user_index]-self.true_user_feature_matrix[user_index], self.user_cov[user_index]),self.user_feature[user_index]-self.true_user_feature_matrix[user_index]))
 		self.real_beta_list.extend([real_beta])
 
+	def start(self):
+		self.initial_user_parameter()
+
+	def select(self, item_fs, user_index, time):
+		## pool index of the chosen arm, the select/update protocol shared with LockstepSimulator
+		cov_inv=self.user_cov_inv[user_index]
+		self.update_beta(user_index, time)
+		max_index, means, x_norms=score_pool(item_fs, self.user_feature[user_index], cov_inv, self.beta)
+		self.x_norm=x_norms[-1]
+		return max_index
+
+	def update(self, true_payoff, selected_item_feature, user_index, time):
+		self.update_user_feature(true_payoff, selected_item_feature, user_index)
+
+	def learning_error(self):
+		return np.linalg.norm(self.user_feature-self.true_user_feature_matrix)
+
 	def select_item(self, item_pool, user_index, time):
 		item_fs=self.item_feature_matrix[item_pool]
-		estimated_payoffs=np.zeros(self.pool_size)
-		cov_inv=np.linalg.pinv(self.user_cov[user_index])
-		self.update_beta(user_index, time)
-		for j in range(self.pool_size):
-			x=item_fs[j]
-			x_norm=np.sqrt(np.dot(np.dot(x, cov_inv),x))
-			est_y=np.dot(x, self.user_feature[user_index])+self.beta*x_norm
-			estimated_payoffs[j]=est_y
-			ucb=self.beta*x_norm
+		max_index=self.select(item_fs, user_index, time)
+		x_norm=self.x_norm
+		ucb=self.beta*x_norm
 
-		max_index=np.argmax(estimated_payoffs)
 		selected_item_index=item_pool[max_index]
 		selected_item_feature=item_fs[max_index]
 		true_payoff=self.true_payoffs[user_index, selected_item_index]+np.random.normal(scale=self.sigma)
-		max_ideal_payoff=np.max(self.true_payoffs[user_index][item_pool])
+		max_ideal_payoff=self.environment.best_payoffs[time]
 		regret=max_ideal_payoff-true_payoff
 		return true_payoff, selected_item_feature, regret, x_norm, ucb
 
@@ -67,10 +88,19 @@ class LINUCB():
 		self.user_cov[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_xx[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_bias[user_index]+=true_payoff*selected_item_feature
-		self.user_feature[user_index]=np.dot(np.linalg.pinv(self.user_cov[user_index]), self.user_bias[user_index])
+		self.user_conf.update(selected_item_feature, self.user_cov_inv[user_index], user_index)
+		self.user_update_counter[user_index]+=1
+		if self.user_update_counter[user_index]%self.refresh==0:
+			self.user_cov_inv[user_index]=np.linalg.inv(self.user_cov[user_index])
+		else:
+			sherman_morrison_update(self.user_cov_inv[user_index], selected_item_feature)
+		self.user_feature[user_index]=np.dot(self.user_cov_inv[user_index], self.user_bias[user_index])
 
-	def run(self,user_array, item_pool_array, iteration):
-		self.initial_user_parameter()
+	def run(self,user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		self.environment=environment
+		self.start()
 		cumulative_regret=[0]
 		learning_error_list=[]
 		x_norm_list=[]
@@ -83,12 +113,15 @@ class LINUCB():
 			item_pool=item_pool_array[time]
 			true_payoff, selected_item_feature, regret, x_norm, ucb=self.select_item(item_pool, user_index, time)
 			x_norm_list.extend([x_norm])
-			self.update_user_feature(true_payoff, selected_item_feature, user_index)
-			error=np.linalg.norm(self.user_feature-self.true_user_feature_matrix)
+			self.update(true_payoff, selected_item_feature, user_index, time)
+			error=self.learning_error()
 			cumulative_regret.extend([cumulative_regret[-1]+regret])
 			learning_error_list.extend([error])
 			inst_regret.extend([regret])
 			ucb_list.extend([ucb])
 			sum_x_norm.extend([sum_x_norm[-1]+x_norm])
 
-		return cumulative_regret[1:], learning_error_list, self.beta_list, x_norm_list, inst_regret, ucb_list, sum_x_norm[1:], self.real_beta_list
\ No newline at end of file
+		self.users.flush()
+		return cumulative_regret[1:], learning_error_list, self.beta_list, x_norm_list, inst_regret, ucb_list, sum_x_norm[1:], self.real_beta_list
+
+instrumentation.register(LINUCB, ['update_beta', 'select_item', 'update_user_feature'])
@@ -4,9 +4,12 @@ from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
 import os 
+from linalg_utils import refreshed_inverse_update, score_pool, ConfidenceState
+from user_state import UserState
+from kron_solver import KronLaplacianSystem
 
 class LINUCB_DIST():
-	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, lap, alpha, delta, sigma):
+	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, lap, alpha, delta, sigma, user_state_path=None, refresh=100):
 		self.dimension=dimension
 		self.user_num=user_num
 		self.item_num=item_num
@@ -18,40 +21,42 @@ class LINUCB_DIST():
 		self.I=np.identity(self.dimension)
 		self.lap=np.identity(self.user_num)
 		self.true_lap=lap
-		self.A=np.identity(self.user_num*self.dimension)
-		self.A_inv=np.identity(self.user_num*self.dimension)
+		## A=blockdiag(X_u^T X_u)+(lap+lap_shift*I) kron I is never formed, each round solves one system in it
+		self.lap_shift=0
+		self.system=KronLaplacianSystem(self.lap, self.dimension, 1.0)
 		self.alpha=alpha
 		self.delta=delta
 		self.sigma=sigma
 		self.beta=0
-		self.user_cov={}
-		self.user_bias={}
+		self.users=UserState(self.user_num, self.dimension, path=user_state_path)
+		self.user_cov=self.users.add_matrix('user_cov')
+		self.user_cov_inv=self.users.add_matrix('user_cov_inv')
+		self.user_update_counter=self.users.add_counter('user_update_counter')
+		self.refresh=refresh
+		self.user_conf=None
+		self.user_bias=self.users.add_vector('user_bias')
 		self.beta_list=[]
 		self.x_norm_list=[]
 		self.true_confidence_bound=[]
 
 	def initial_user_parameter(self):
-		for u in range(self.user_num):
-			self.user_cov[u]=self.alpha*np.identity(self.dimension)
-			self.user_bias[u]=np.zeros(self.dimension)
+		self.users.set_identity('user_cov', self.alpha)
+		self.users.set_identity('user_cov_inv', 1/self.alpha)
+		self.users.reset('user_update_counter')
+		self.user_conf=ConfidenceState(self.alpha*self.I, user_num=self.user_num)
+		self.users.reset('user_bias')
 
 	def update_beta(self, user_index):
-		self.beta=self.sigma*np.sqrt(2*np.log(np.linalg.det(self.user_cov[user_index])**(1/2)*np.linalg.det(self.alpha*self.I)**(-1/2)/self.delta))+self.alpha*np.linalg.norm(self.true_user_feature_matrix[user_index])
+		self.beta=self.user_conf.radius(self.sigma, self.delta, user_index)+self.alpha*np.linalg.norm(self.true_user_feature_matrix[user_index])
 		self.beta_list.extend([self.beta])
 
 	def select_item(self, item_pool, user_index):
 		item_fs=self.item_feature_matrix[item_pool]
-		estimated_payoffs=np.zeros(self.pool_size)
 		self.update_beta(user_index)
-		cov_inv=np.linalg.pinv(self.user_cov[user_index])
-		for j in range(self.pool_size):
-			x=item_fs[j]
-			x_norm=np.sqrt(np.dot(np.dot(x, cov_inv),x))
-			est_y=np.dot(x, self.user_feature[user_index])+self.beta*x_norm
-			estimated_payoffs[j]=est_y
-		self.x_norm_list.extend([x_norm])
+		cov_inv=self.user_cov_inv[user_index]
+		max_index, means, x_norms=score_pool(item_fs, self.user_feature[user_index], cov_inv, self.beta)
+		self.x_norm_list.extend([x_norms[-1]])
 
-		max_index=np.argmax(estimated_payoffs)
 		selected_item_index=item_pool[max_index]
 		selected_item_feature=item_fs[max_index]
 		true_payoff=self.true_payoffs[user_index, selected_item_index]
@@ -60,31 +65,34 @@ class LINUCB_DIST():
 		return true_payoff, selected_item_feature, regret
 
 	def update_user_feature(self, true_payoff, selected_item_feature, user_index):
+		self.user_conf.update(selected_item_feature, self.user_cov_inv[user_index], user_index)
 		self.user_cov[user_index]+=np.outer(selected_item_feature, selected_item_feature)
+		self.user_update_counter[user_index]+=1
+		refreshed_inverse_update(self.user_cov_inv[user_index], self.user_cov[user_index], selected_item_feature, self.user_update_counter[user_index], self.refresh)
 		self.user_bias[user_index]+=true_payoff*selected_item_feature
-		self.user_feature[user_index]=np.dot(np.linalg.pinv(self.user_cov[user_index]), self.user_bias[user_index])
+		self.user_feature[user_index]=np.dot(self.user_cov_inv[user_index], self.user_bias[user_index])
 		x=selected_item_feature.copy()
-		x_long=np.zeros(self.user_num*self.dimension)
-		x_long[user_index*self.dimension:(user_index+1)*self.dimension]=x
-		self.A+=np.outer(x_long,x_long)
-		self.A_inv=np.linalg.pinv(self.A)
-		for us in range(self.user_num):
-			if us==user_index:
-				pass 
-			else:
-				self.user_feature[us]+=np.dot(self.A_inv[us*self.dimension:(us+1)*self.dimension][:, user_index*self.dimension:(user_index+1)*self.dimension], true_payoff*x)
+		self.system.add(user_index, x, true_payoff)
+		## A^{-1}[:, user block] y x for all users at once
+		rhs=np.zeros((self.user_num, self.dimension))
+		rhs[user_index]=true_payoff*x
+		propagated=self.system.solve(rhs)
+		propagated[user_index]=0.0
+		self.user_feature+=propagated
 
 		delta=self.user_feature[user_index]-self.true_user_feature_matrix[user_index]
 		bound=np.dot(np.dot(delta, self.user_cov[user_index]), delta)
 		self.true_confidence_bound.extend([bound])
 
 	def update_lap(self):
-		adj=rbf_kernel(self.user_feature)
-		lap_t_1=self.lap.copy()
-		self.lap=self.true_lap.copy()
+		#adj=rbf_kernel(self.user_feature)
 		#self.lap=csgraph.laplacian(adj, normed=False)
-		self.A=self.A-np.kron(lap_t_1, np.identity(self.dimension))
-		self.A+=np.kron(self.lap, np.identity(self.dimension))+np.identity(self.user_num*self.dimension)
+		## every round adds I to A, an unchanged Laplacian needs nothing else
+		self.lap_shift+=1
+		self.system.set_shift(self.lap_shift)
+		if not np.array_equal(self.lap, self.true_lap):
+			self.lap=self.true_lap.copy()
+			self.system.set_laplacian(self.lap)
 
 	def run(self,  user_array, item_pool_array, iteration):
 		self.initial_user_parameter()
@@ -103,4 +111,5 @@ class LINUCB_DIST():
 			learning_error_list.extend([error])
 			lap_error_list.extend([np.linalg.norm(self.lap-self.true_lap)])
 
+		self.users.flush()
 		return np.array(cumulative_regret), np.array(learning_error_list), np.array(lap_error_list)
@@ -4,9 +4,10 @@ from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
 import os 
+from linalg_utils import ConfidenceState, refreshed_inverse_update
 
 class LINUCB_SIN(): # together update feature and confidence bound
-	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, delta, sigma):
+	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, delta, sigma, refresh=100):
 		self.dimension=dimension
 		self.user_num=user_num
 		self.item_num=item_num
@@ -23,13 +24,17 @@ class LINUCB_SIN(): # together update feature and confidence bound
 		self.sigma=sigma
 		self.beta=0
 		self.covariance=self.alpha*self.I
+		self.cov_inv=self.I_inv/self.alpha
+		self.conf=ConfidenceState(self.covariance, logdet=self.user_num*self.dimension*np.log(self.alpha))
+		self.refresh=refresh
+		self.update_counter=0
 		self.bias=np.zeros(self.user_num*self.dimension)
 		self.beta_list=[]
 		self.x_norm_list=[]
 		self.true_confidence_bound=[]
 
 	def update_beta(self):
-		self.beta=self.sigma*np.sqrt(2*np.log(np.linalg.det(self.covariance)**(1/2)*np.linalg.det(self.alpha*self.I)**(-1/2)/self.delta))+self.alpha*np.linalg.norm(self.true_user_feature_vector)
+		self.beta=self.conf.radius(self.sigma, self.delta)+self.alpha*np.linalg.norm(self.true_user_feature_vector)
 		self.beta_list.extend([self.beta])
 
 	def select_item(self, item_pool, user_index):
@@ -38,7 +43,7 @@ class LINUCB_SIN(): # together update feature and confidence bound
 		item_feature_array[:,user_index*self.dimension:(user_index+1)*self.dimension]=item_fs
 		estimated_payoffs=np.zeros(self.pool_size)
 		self.update_beta()
-		cov_inv=np.linalg.pinv(self.covariance)
+		cov_inv=self.cov_inv
 		for j in range(self.pool_size):
 			x=item_feature_array[j]
 			x_norm=np.sqrt(np.dot(np.dot(x,cov_inv),x))
@@ -56,9 +61,12 @@ class LINUCB_SIN(): # together update feature and confidence bound
 		return true_payoff, selected_item_feature, regret
 
 	def update_user_feature(self, true_payoff, selected_item_feature, user_index):
+		self.conf.update(selected_item_feature, self.cov_inv)
 		self.covariance+=np.outer(selected_item_feature, selected_item_feature)
 		self.bias+=true_payoff*selected_item_feature
-		self.user_feature=np.dot(np.linalg.pinv(self.covariance), self.bias)
+		self.update_counter+=1
+		refreshed_inverse_update(self.cov_inv, self.covariance, selected_item_feature, self.update_counter, self.refresh)
+		self.user_feature=np.dot(self.cov_inv, self.bias)
 		delta=self.user_feature-self.true_user_feature_vector
 		bound=np.dot(np.dot(delta, self.covariance), delta)
 		self.true_confidence_bound.extend([bound])
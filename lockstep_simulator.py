@@ -0,0 +1,39 @@
+import numpy as np
+from environment import Environment
+
+
+class LockstepSimulator():
+	## advances several models over one user/pool stream, each round's pool features, oracle payoffs
+	## and noise are computed once and handed to every model
+	## a model takes part through start(), select(item_fs, user_index, time) -> pool index,
+	## update(payoff, x, user_index, time) and learning_error()
+	def __init__(self, models, item_feature_matrix, true_payoffs, sigma):
+		self.models=models
+		self.names=list(models)
+		self.item_feature_matrix=item_feature_matrix
+		self.true_payoffs=true_payoffs
+		self.sigma=sigma
+
+	def run(self, user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		for name in self.names:
+			self.models[name].start()
+		inst_regret={name: np.zeros(iteration) for name in self.names}
+		learning_error={name: np.zeros(iteration) for name in self.names}
+		for time in range(iteration):
+			print('time/iteration', time, iteration, '~~~Lockstep')
+			user_index=user_array[time]
+			item_pool=item_pool_array[time]
+			item_fs=self.item_feature_matrix[item_pool]
+			payoffs=environment.pool_payoffs[time]
+			max_ideal_payoff=environment.best_payoffs[time]
+			## one noise draw per arm, so models picking the same arm observe the same payoff
+			observed=payoffs+np.random.normal(scale=self.sigma, size=len(item_pool))
+			for name in self.names:
+				model=self.models[name]
+				max_index=model.select(item_fs, user_index, time)
+				model.update(observed[max_index], item_fs[max_index], user_index, time)
+				inst_regret[name][time]=max_ideal_payoff-observed[max_index]
+				learning_error[name][time]=model.learning_error()
+		return {name: {'regret': np.cumsum(inst_regret[name]), 'error': learning_error[name]} for name in self.names}
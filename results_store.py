@@ -0,0 +1,138 @@
+import numpy as np
+import os
+import json
+import uuid
+
+## every run gets one line in index.jsonl and a directory of fixed-size .npy chunks per trace
+## index lines and chunks are only ever added or replaced whole, so readers never see a torn file
+
+def _plain(value):
+	if isinstance(value, np.generic):
+		return value.item()
+	if isinstance(value, np.ndarray):
+		return value.tolist()
+	return value
+
+
+class RunWriter():
+	## streams rows of one run, a chunk is written as soon as it fills and the partial tail on flush()
+	def __init__(self, store, record):
+		self.store=store
+		self.record=record
+		self.chunk_size=record['chunk_size']
+		self.buffers={}
+		self.chunk_index={}
+
+	def append(self, **values):
+		for name, value in values.items():
+			self.extend(**{name: np.asarray(value)[None]})
+
+	def extend(self, **arrays):
+		for name, array in arrays.items():
+			array=np.asarray(array)
+			buffer=self.buffers.get(name)
+			if buffer is None:
+				buffer=np.zeros((0,)+array.shape[1:], dtype=array.dtype)
+				self.chunk_index[name]=0
+			buffer=np.concatenate([buffer, array.astype(buffer.dtype, copy=False)])
+			while len(buffer)>=self.chunk_size:
+				self.store.write_chunk(self.record, name, self.chunk_index[name], buffer[:self.chunk_size])
+				self.chunk_index[name]+=1
+				buffer=buffer[self.chunk_size:]
+			self.buffers[name]=buffer
+
+	def flush(self):
+		## the partial chunk is rewritten whole each time, it stays in the buffer until it fills
+		for name, buffer in self.buffers.items():
+			if len(buffer)>0:
+				self.store.write_chunk(self.record, name, self.chunk_index[name], buffer)
+
+	def close(self):
+		self.flush()
+
+
+class ResultsStore():
+	def __init__(self, path, chunk_size=1024):
+		self.path=path
+		self.chunk_size=chunk_size
+		self.index_path=os.path.join(self.path, 'index.jsonl')
+		os.makedirs(self.path, exist_ok=True)
+
+	def writer(self, algorithm, graph=None, params=None, seed=None):
+		record={'run_id': uuid.uuid4().hex[:16], 'algorithm': algorithm, 'graph': graph, 'params': {name: _plain(value) for name, value in (params or {}).items()}, 'seed': _plain(seed), 'chunk_size': self.chunk_size}
+		os.makedirs(self.run_path(record), exist_ok=True)
+		with open(self.index_path, 'a') as f:
+			f.write(json.dumps(record, sort_keys=True)+'\n')
+		return RunWriter(self, record)
+
+	def write_run(self, algorithm, graph=None, params=None, seed=None, **traces):
+		## a finished run in one call, e.g. write_run('lapucb', 'rbf', {'smooth': 2}, 0, regret=r, error=e)
+		writer=self.writer(algorithm, graph, params, seed)
+		writer.extend(**traces)
+		writer.close()
+		return writer.record
+
+	def run_path(self, record):
+		return os.path.join(self.path, record['run_id'])
+
+	def chunk_path(self, record, name, chunk):
+		return os.path.join(self.run_path(record), '%s_%06d.npy'%(name, chunk))
+
+	def write_chunk(self, record, name, chunk, array):
+		final=self.chunk_path(record, name, chunk)
+		temp=final+'.%d.tmp'%os.getpid()
+		with open(temp, 'wb') as f:
+			np.save(f, array)
+		os.replace(temp, final)
+
+	def records(self):
+		if not os.path.exists(self.index_path):
+			return []
+		with open(self.index_path) as f:
+			return [json.loads(line) for line in f if line.strip()]
+
+	def select(self, algorithm=None, graph=None, seed=None, **params):
+		## metadata query, params match on equality, e.g. select('lapucb', 'er', smooth=2.0)
+		selected=[]
+		for record in self.records():
+			if algorithm is not None and record['algorithm']!=algorithm:
+				continue
+			if graph is not None and record['graph']!=graph:
+				continue
+			if seed is not None and record['seed']!=_plain(seed):
+				continue
+			if any(record['params'].get(name)!=_plain(value) for name, value in params.items()):
+				continue
+			selected.append(record)
+		return selected
+
+	def chunks(self, record, name):
+		chunks=[]
+		while os.path.exists(self.chunk_path(record, name, len(chunks))):
+			chunks.append(len(chunks))
+		return chunks
+
+	def length(self, record, name):
+		chunks=self.chunks(record, name)
+		if not chunks:
+			return 0
+		last=np.load(self.chunk_path(record, name, chunks[-1]), mmap_mode='r')
+		return chunks[-1]*record['chunk_size']+len(last)
+
+	def trace(self, record, name, start=0, stop=None):
+		## rows [start, stop) of one trace, only the chunks they fall in are mapped
+		size=record['chunk_size']
+		if stop is None:
+			stop=self.length(record, name)
+		pieces=[]
+		for chunk in range(start//size, -(-stop//size)):
+			data=np.load(self.chunk_path(record, name, chunk), mmap_mode='r')
+			pieces.append(data[max(start-chunk*size, 0):stop-chunk*size])
+		if not pieces:
+			return np.zeros(0)
+		return np.concatenate(pieces)
+
+	def final(self, record, name):
+		## e.g. the cumulative regret at the horizon, reads the last chunk only
+		stop=self.length(record, name)
+		return self.trace(record, name, stop-1, stop)[0]
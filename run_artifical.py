@@ -17,6 +17,7 @@ from lapucb import LAPUCB
 from lapucb_sim import LAPUCB_SIM
 from club import CLUB
 from utils import *
+from experiment_runner import ExperimentRunner
 path='../bandit_results/simulated/'
 save_path='../bandit_results/camera_ready_results/'
 #np.random.seed(2018)
@@ -81,81 +82,75 @@ np.fill_diagonal(true_lap, 1)
 #true_norm_lap=csgraph.laplacian(true_adj, normed=True)
 
 
-linucb_regret_matrix=np.zeros((loop, iteration))
-linucb_error_matrix=np.zeros((loop, iteration))
-gob_regret_matrix=np.zeros((loop, iteration))
-gob_error_matrix=np.zeros((loop, iteration))
-lapucb_regret_matrix=np.zeros((loop, iteration))
-lapucb_error_matrix=np.zeros((loop, iteration))
-lapucb_sim_regret_matrix=np.zeros((loop, iteration))
-lapucb_sim_error_matrix=np.zeros((loop, iteration))
-club_regret_matrix=np.zeros((loop, iteration))
-club_error_matrix=np.zeros((loop, iteration))
+def setup_loop(l, shared):
+	problem=dict(shared)
+	problem['user_feature_matrix']=dictionary_matrix_generator(user_num, dimension, shared['true_lap'], 7)
+	problem['true_payoffs']=np.dot(problem['user_feature_matrix'], shared['item_feature_matrix'].T)
+	return problem
 
-for l in range(loop):
-	print('loop/total_loop', l, loop)
-	user_feature_matrix=dictionary_matrix_generator(user_num, dimension, true_lap, 7)
-	true_payoffs=np.dot(user_feature_matrix, item_feature_matrix.T)
+def build_linucb(p):
+	return LINUCB(dimension, iteration, user_num, item_num, pool_size, p['item_feature_matrix'], p['user_feature_matrix'], p['true_payoffs'], alpha, delta, sigma, state)
 
-	linucb_model=LINUCB(dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, alpha, delta, sigma, state)
+def build_gob(p):
+	return GOB(dimension, iteration, user_num, item_num, pool_size, p['item_feature_matrix'], p['user_feature_matrix'], p['true_payoffs'], p['true_adj'], p['true_lap'], alpha, delta, sigma, beta, state)
 
-	gob_model=GOB(dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, beta, state)
+def build_lapucb(p):
+	return LAPUCB(dimension, iteration, user_num, item_num, pool_size, p['item_feature_matrix'], p['user_feature_matrix'], p['true_payoffs'], p['true_adj'], p['true_lap'], alpha, delta, sigma, beta, thres, 1)
 
-	lapucb_model=LAPUCB(dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, beta, thres, 1)
+def build_lapucb_sim(p):
+	return LAPUCB_SIM(dimension, iteration, user_num, item_num, pool_size, p['item_feature_matrix'], p['user_feature_matrix'], p['true_payoffs'], p['true_adj'], p['true_lap'], alpha, delta, sigma, beta, thres, 1)
 
-	lapucb_sim_model=LAPUCB_SIM(dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, alpha, delta, sigma, beta, thres, 1)
+def build_club(p):
+	return CLUB(dimension, iteration, user_num, item_num, pool_size, p['item_feature_matrix'], p['user_feature_matrix'], p['true_payoffs'], alpha, alpha_2, delta, sigma, beta, state)
 
-	club_model = CLUB(dimension, iteration, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, alpha, alpha_2, delta, sigma, beta, state)
+## (loop x algorithm) jobs run in worker processes, the random inputs drawn above are shipped to them
+if __name__=='__main__':
+	shared={'user_seq': user_seq, 'item_pool_seq': item_pool_seq, 'iteration': iteration, 'item_feature_matrix': item_feature_matrix, 'true_adj': true_adj, 'true_lap': true_lap}
+	runner=ExperimentRunner(setup_loop, {'linucb': build_linucb, 'gob': build_gob, 'lapucb': build_lapucb, 'lapucb_sim': build_lapucb_sim, 'club': build_club}, loop, seed=2018, shared=shared)
+	results=runner.run()
+	linucb_regret_matrix, linucb_error_matrix=results['linucb']['regret'], results['linucb']['error']
+	gob_regret_matrix, gob_error_matrix=results['gob']['regret'], results['gob']['error']
+	lapucb_regret_matrix, lapucb_error_matrix=results['lapucb']['regret'], results['lapucb']['error']
+	lapucb_sim_regret_matrix, lapucb_sim_error_matrix=results['lapucb_sim']['regret'], results['lapucb_sim']['error']
+	club_regret_matrix, club_error_matrix=results['club']['regret'], results['club']['error']
 
-	linucb_regret, linucb_error, linucb_beta, linucb_x_norm, linucb_inst_regret, linucb_ucb, linucb_sum_x_norm, linucb_real_beta=linucb_model.run(user_seq, item_pool_seq, iteration)
-	gob_regret, gob_error, gob_beta,  gob_x_norm, gob_ucb, gob_sum_x_norm, gob_real_beta=gob_model.run(user_seq, item_pool_seq, iteration)
-	lapucb_regret, lapucb_error, lapucb_beta, lapucb_x_norm, lapucb_inst_regret, lapucb_ucb, lapucb_sum_x_norm, lapucb_real_beta=lapucb_model.run(user_seq, item_pool_seq, iteration)
-	lapucb_sim_regret, lapucb_sim_error, lapucb_sim_beta, lapucb_sim_x_norm, lapucb_sim_avg_norm, lapucb_sim_inst_regret, lapucb_sim_ucb, lapucb_sim_sum_x_norm=lapucb_sim_model.run( user_seq, item_pool_seq, iteration)
-	club_regret, club_error,club_cluster_num, club_beta, club_x_norm=club_model.run(user_seq, item_pool_seq, iteration)
 
-	linucb_regret_matrix[l], linucb_error_matrix[l]=linucb_regret, linucb_error
-	gob_regret_matrix[l], gob_error_matrix[l]=gob_regret, gob_error
-	lapucb_regret_matrix[l], lapucb_error_matrix[l]=lapucb_regret, lapucb_error
-	lapucb_sim_regret_matrix[l], lapucb_sim_error_matrix[l]=lapucb_sim_regret, lapucb_sim_error
-	club_regret_matrix[l], club_error_matrix[l]=club_regret, club_error
+	linucb_mean=np.mean(linucb_regret_matrix, axis=0)
+	linucb_sd=linucb_regret_matrix.std(0)
 
+	gob_mean=np.mean(gob_regret_matrix, axis=0)
+	gob_sd=gob_regret_matrix.std(0)
 
-linucb_mean=np.mean(linucb_regret_matrix, axis=0)
-linucb_sd=linucb_regret_matrix.std(0)
+	lapucb_mean=np.mean(lapucb_regret_matrix, axis=0)
+	lapucb_sd=lapucb_regret_matrix.std(0)
 
-gob_mean=np.mean(gob_regret_matrix, axis=0)
-gob_sd=gob_regret_matrix.std(0)
+	lapucb_sim_mean=np.mean(lapucb_sim_regret_matrix, axis=0)
+	lapucb_sim_sd=lapucb_sim_regret_matrix.std(0)
 
-lapucb_mean=np.mean(lapucb_regret_matrix, axis=0)
-lapucb_sd=lapucb_regret_matrix.std(0)
-
-lapucb_sim_mean=np.mean(lapucb_sim_regret_matrix, axis=0)
-lapucb_sim_sd=lapucb_sim_regret_matrix.std(0)
-
-club_mean=np.mean(club_regret_matrix, axis=0)
-club_sd=club_regret_matrix.std(0)
+	club_mean=np.mean(club_regret_matrix, axis=0)
+	club_sd=club_regret_matrix.std(0)
 
 # plt.figure(figsize=(5,5))
 # plt.errorbar(range(iteration),linucb_mean, linucb_sd*0.95, markevery=0.2, marker='.')
 # plt.show()
-x=range(iteration)
-plt.figure(figsize=(5,5))
-plt.plot(x, linucb_mean, '-.', markevery=0.1, linewidth=2, markersize=8, label='LinUCB')
-plt.fill_between(x, linucb_mean-linucb_sd, linucb_mean+linucb_sd, color='b', alpha=0.2)
-plt.plot(x, gob_mean, '-p', color='orange', markevery=0.1, linewidth=2, markersize=8, label='Gob.Lin')
-plt.fill_between(x, gob_mean-gob_sd, gob_mean+gob_sd, color='orange', alpha=0.2)
-plt.plot(x, lapucb_sim_mean, '-s', color='g', markevery=0.1, linewidth=2, markersize=8, label='GraphUCB-Local')
-plt.fill_between(x, lapucb_sim_mean-lapucb_sim_sd, lapucb_sim_mean+lapucb_sim_sd, color='g', alpha=0.2)
-plt.plot(x, lapucb_mean, '-o', color='r', markevery=0.1, linewidth=2, markersize=8, label='GraphUCB')
-plt.fill_between(x, lapucb_mean-lapucb_sd, lapucb_mean+lapucb_sd, color='r', alpha=0.2)
-plt.plot(x, club_mean, '-*', color='k', markevery=0.1, linewidth=2, markersize=8, label='CLUB')
-plt.fill_between(x, club_mean-club_sd, club_mean+club_sd, color='k', alpha=0.2)
-plt.ylabel('Cumulative Regret', fontsize=16)
-plt.xlabel('Time', fontsize=16)
-plt.legend(loc=2, fontsize=14)
-plt.tight_layout()
-plt.savefig(save_path+'ws_cum_regret'+'.png', dpi=100)
-plt.show()
+	x=range(iteration)
+	plt.figure(figsize=(5,5))
+	plt.plot(x, linucb_mean, '-.', markevery=0.1, linewidth=2, markersize=8, label='LinUCB')
+	plt.fill_between(x, linucb_mean-linucb_sd, linucb_mean+linucb_sd, color='b', alpha=0.2)
+	plt.plot(x, gob_mean, '-p', color='orange', markevery=0.1, linewidth=2, markersize=8, label='Gob.Lin')
+	plt.fill_between(x, gob_mean-gob_sd, gob_mean+gob_sd, color='orange', alpha=0.2)
+	plt.plot(x, lapucb_sim_mean, '-s', color='g', markevery=0.1, linewidth=2, markersize=8, label='GraphUCB-Local')
+	plt.fill_between(x, lapucb_sim_mean-lapucb_sim_sd, lapucb_sim_mean+lapucb_sim_sd, color='g', alpha=0.2)
+	plt.plot(x, lapucb_mean, '-o', color='r', markevery=0.1, linewidth=2, markersize=8, label='GraphUCB')
+	plt.fill_between(x, lapucb_mean-lapucb_sd, lapucb_mean+lapucb_sd, color='r', alpha=0.2)
+	plt.plot(x, club_mean, '-*', color='k', markevery=0.1, linewidth=2, markersize=8, label='CLUB')
+	plt.fill_between(x, club_mean-club_sd, club_mean+club_sd, color='k', alpha=0.2)
+	plt.ylabel('Cumulative Regret', fontsize=16)
+	plt.xlabel('Time', fontsize=16)
+	plt.legend(loc=2, fontsize=14)
+	plt.tight_layout()
+	plt.savefig(save_path+'ws_cum_regret'+'.png', dpi=100)
+	plt.show()
 
 
 # df=pd.DataFrame(columns=['Time', 'LinUCB', 'Gob.Lin', 'GraphUCB', 'GraphUCB-Local', 'CLUB'])
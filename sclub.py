@@ -4,11 +4,16 @@ from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
 import os 
+import networkx as nx
 from community import community_louvain
 from utils import *
+from linalg_utils import score_pool
+from environment import Environment
+import instrumentation
+from cluster_stats import ClusterStatistics
 
 class SCLUB():
-	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, normed_L,k, alpha, delta, sigma, beta):
+	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, normed_L,k, alpha, delta, sigma, beta, repartition_every=1):
 		self.dimension=dimension
 		self.user_num=user_num
 		self.item_num=item_num
@@ -16,11 +21,18 @@ class SCLUB():
 		self.item_feature_matrix=item_feature_matrix
 		self.true_user_feature_matrix=true_user_feature_matrix
 		self.true_payoffs=true_payoffs
+		self.environment=None
 		self.user_feature=np.zeros((self.user_num, self.dimension))
 		self.I=np.identity(self.user_num)
 		self.adj=np.zeros((self.user_num, self.user_num))
 		self.k=k
 		self.cluster_list=np.array(list(range(self.user_num)))
+		## between full Louvain runs only the communities around the changed user are re-optimised
+		self.repartition_every=repartition_every
+		self.round_counter=0
+		self.next_label=self.user_num
+		self.graph=nx.Graph()
+		self.graph.add_nodes_from(list(range(self.user_num)))
 		self.alpha=alpha
 		self.delta=delta
 		self.sigma=sigma
@@ -30,7 +42,8 @@ class SCLUB():
 		self.bias=np.zeros((self.user_num, self.dimension))
 		self.served_user_list=[]
 		self.user_cluster_cov={i: np.identity(self.dimension) for i in range(self.user_num)}
-		self.user_cluster_bias=np.zeros((self.user_num, self.dimension))
+		self.user_cluster_cov_inv={i: np.identity(self.dimension) for i in range(self.user_num)}
+		self.cluster_stats=ClusterStatistics(self.cluster_list, self.dimension)
 		self.user_cluster_feature=np.zeros((self.user_num, self.dimension))
 
 	def update_cluster_by_cummunity_detection(self, user_index):
@@ -39,30 +52,52 @@ class SCLUB():
 		small_index=np.argsort(adj_row)[:self.user_num-self.k]
 		adj_row[small_index]=0.0
 		#adj_row[big_index]=1.0
+		touched=np.union1d(np.flatnonzero(self.adj[user_index]), np.flatnonzero(adj_row))
+		touched=np.union1d(touched, [user_index])
 		self.adj[user_index,:]=adj_row
 		self.adj[:,user_index]=adj_row
-		graph, edge_num=create_networkx_graph(self.user_num, self.adj)
-		parts=community_louvain.best_partition(graph)
-		self.cluster_list=[parts.get(node) for node in graph.nodes()]
-		self.cluster_list=np.array([int(x) for x in self.cluster_list])
+		self.update_graph_row(user_index, adj_row)
+		self.round_counter+=1
+		if self.round_counter%self.repartition_every==0:
+			parts=community_louvain.best_partition(self.graph)
+			self.cluster_list=[parts.get(node) for node in self.graph.nodes()]
+			self.cluster_list=np.array([int(x) for x in self.cluster_list])
+			self.next_label=np.max(self.cluster_list)+1
+		else:
+			self.update_communities_locally(touched)
 		self.cluster_num=len(np.unique(self.cluster_list))
+		self.cluster_stats.relabel(self.cluster_list)
 
-	def update_cluster_feature(self, user_index):
-		user_cluster_index=self.cluster_list[user_index]
-		all_users_in_the_cluster=list(np.where(self.cluster_list==user_cluster_index)[0])
-		self.user_cluster_cov[user_index]=np.identity(self.dimension)
-		self.user_cluster_bias[user_index]=np.zeros(self.dimension)
-		for u in all_users_in_the_cluster:
-			self.user_cluster_cov[user_index]+=self.covariance[u]-np.identity(self.dimension)
-			self.user_cluster_bias[user_index]+=self.bias[u]
+	def update_graph_row(self, user_index, adj_row):
+		## the networkx graph follows adj instead of being rebuilt from it
+		self.graph.remove_edges_from(list(self.graph.edges(user_index)))
+		self.graph.add_weighted_edges_from([(user_index, int(j), adj_row[j]) for j in np.flatnonzero(adj_row)])
+
+	def update_communities_locally(self, touched):
+		## warm-started Louvain on the communities holding the changed user and its old and new neighbours
+		communities=np.unique(self.cluster_list[touched])
+		nodes=np.flatnonzero(np.isin(self.cluster_list, communities))
+		subgraph=self.graph.subgraph(nodes.tolist())
+		init={int(u): int(self.cluster_list[u]) for u in nodes}
+		parts=community_louvain.best_partition(subgraph, partition=init)
+		new_labels=np.array([parts[int(u)] for u in nodes])
+		## fresh labels keep the labels of untouched communities stable
+		self.cluster_list[nodes]=self.next_label+new_labels
+		self.next_label+=np.max(new_labels)+1
 
-		new_cluster_feature=np.dot(np.linalg.pinv(self.user_cluster_cov[user_index]), self.user_cluster_bias[user_index])
-		for u in all_users_in_the_cluster:
-			self.user_cluster_feature[u]=new_cluster_feature
+	def update_cluster_feature(self, user_index):
+		## running cluster sums moved by relabel, the inverse is cached per community
+		label=self.cluster_list[user_index]
+		cluster_cov_inv=self.cluster_stats.cluster_inv(label)
+		self.user_cluster_cov[user_index]=self.cluster_stats.cluster_cov(label)
+		self.user_cluster_cov_inv[user_index]=cluster_cov_inv.copy()
+		new_cluster_feature=np.dot(cluster_cov_inv, self.cluster_stats.cluster_bias(label))
+		self.user_cluster_feature[self.cluster_list==label]=new_cluster_feature
 
 	def update_user_feature(self, true_payoff, selected_item_feature, user_index):
 		self.covariance[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.bias[user_index]+=true_payoff*selected_item_feature
+		self.cluster_stats.add(user_index, selected_item_feature, true_payoff)
 		self.user_feature[user_index]=np.dot(np.linalg.pinv(self.covariance[user_index]), self.bias[user_index])
 
 	def update_beta(self, user_index): #no used 
@@ -72,26 +107,20 @@ class SCLUB():
 		self.beta_list.extend([self.beta])
 
 	def select_item(self, user_index, item_pool, time):
-		cluster_cov=self.user_cluster_cov[user_index]
-		cluster_cov_inv=np.linalg.pinv(cluster_cov)
-		est_payoffs=[]
+		cluster_cov_inv=self.user_cluster_cov_inv[user_index]
 		self.update_beta(user_index)
-		for it in item_pool:
-			x=self.item_feature_matrix[it]
-			x_norm=np.sqrt(np.dot(np.dot(x, cluster_cov_inv), x))
-			est_payoff=np.dot(self.user_cluster_feature[user_index], x)+self.beta*x_norm
-			#*np.sqrt(np.log(time+1))
-			est_payoffs.extend([est_payoff])
-
-		itt=np.argmax(est_payoffs)
+		itt, means, x_norms=score_pool(self.item_feature_matrix[item_pool], self.user_cluster_feature[user_index], cluster_cov_inv, self.beta)
 		id_=item_pool[itt]
 		selected_item_feature=self.item_feature_matrix[id_]
 		true_payoff=self.true_payoffs[user_index, id_]
-		true_max_payoff=np.max(self.true_payoffs[user_index][item_pool])
+		true_max_payoff=self.environment.best_payoffs[time]
 		regret=true_max_payoff-true_payoff
 		return true_payoff, regret, selected_item_feature
 
-	def run(self, user_array, item_pool_array, iteration):
+	def run(self, user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		self.environment=environment
 		regret_error=[0]
 		learning_error=[]
 		cluster_num=[]
@@ -110,8 +139,4 @@ class SCLUB():
 			cluster_num.extend([self.cluster_num])
 		return regret_error, learning_error,cluster_num, self.beta_list
 
-
-
-
-
-
+instrumentation.register(SCLUB, ['update_beta', 'select_item', 'update_user_feature', 'update_cluster_by_cummunity_detection', 'update_cluster_feature'])
@@ -4,9 +4,10 @@ from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
 import os 
+from linalg_utils import ConfidenceState, refreshed_inverse_update
 
 class Share_LINUCB():
-	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, lap, alpha, delta, sigma):
+	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, lap, alpha, delta, sigma, refresh=100):
 		self.dimension=dimension
 		self.user_num=user_num
 		self.item_num=item_num
@@ -24,11 +25,15 @@ class Share_LINUCB():
 		self.sigma=sigma
 		self.beta=0
 		self.covariance=self.alpha*self.I
+		self.cov_inv=self.I/self.alpha
+		self.conf=ConfidenceState(self.covariance, logdet=self.user_num*self.dimension*np.log(self.alpha))
+		self.refresh=refresh
+		self.update_counter=0
 		self.bias=np.zeros(self.user_num*self.dimension)
 
 
 	def update_beta(self):
-		self.beta=self.sigma*np.sqrt(2*np.log(np.linalg.det(self.covariance)**(1/2)*np.linalg.det(self.alpha*self.I)**(-1/2)/self.delta))+self.alpha*np.linalg.norm(self.true_user_feature_vector)
+		self.beta=self.conf.radius(self.sigma, self.delta)+self.alpha*np.linalg.norm(self.true_user_feature_vector)
 
 	def select_item(self, item_pool, user_index):
 		item_fs=self.item_feature_matrix[item_pool]
@@ -38,7 +43,7 @@ class Share_LINUCB():
 		self.update_beta()
 		for j in range(self.pool_size):
 			x=item_feature_array[j]
-			x_norm=np.sqrt(np.dot(np.dot(x, np.linalg.pinv(self.covariance)),x))
+			x_norm=np.sqrt(np.dot(np.dot(x, self.cov_inv),x))
 			est_y=np.dot(x, self.user_feature)+self.beta*x_norm
 			estimated_payoffs[j]=est_y
 
@@ -51,9 +56,12 @@ class Share_LINUCB():
 		return true_payoff, selected_item_feature, regret
 
 	def update_user_feature(self, true_payoff, selected_item_feature, user_index):
-		self.covariance+=np.outer(selected_item_feature)
+		self.conf.update(selected_item_feature, self.cov_inv)
+		self.covariance+=np.outer(selected_item_feature, selected_item_feature)
 		self.bias+=true_payoff*selected_item_feature
-		self.user_feature=np.dot(np.linalg.pinv(self.covariance), self.bias)
+		self.update_counter+=1
+		refreshed_inverse_update(self.cov_inv, self.covariance, selected_item_feature, self.update_counter, self.refresh)
+		self.user_feature=np.dot(self.cov_inv, self.bias)
 
 	def run(self,  user_array, item_pool_array, iteration):
 		cumulative_regret=[0]
@@ -0,0 +1,31 @@
+import numpy as np
+import scipy.sparse
+
+class CSRGraph():
+	## weighted graph as CSR arrays, for code that only needs neighbours and weights
+	def __init__(self, node_num, adj_matrix):
+		adj=scipy.sparse.csr_matrix(adj_matrix, shape=(node_num, node_num))
+		adj.eliminate_zeros()
+		adj.sort_indices()
+		self.node_num=node_num
+		self.indptr=adj.indptr
+		self.indices=adj.indices
+		self.data=adj.data
+
+	def neighbors(self, node):
+		return self.indices[self.indptr[node]:self.indptr[node+1]]
+
+	def weights(self, node):
+		return self.data[self.indptr[node]:self.indptr[node+1]]
+
+	def degree(self):
+		## weighted degree of every node
+		return np.bincount(np.repeat(np.arange(self.node_num), np.diff(self.indptr)), weights=self.data, minlength=self.node_num)
+
+	def number_of_edges(self):
+		## undirected edges as networkx counts them, a self loop counts once
+		pattern=self.to_scipy()!=0
+		return scipy.sparse.triu(pattern+pattern.T).nnz
+
+	def to_scipy(self):
+		return scipy.sparse.csr_matrix((self.data, self.indices, self.indptr), shape=(self.node_num, self.node_num))
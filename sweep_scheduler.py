@@ -0,0 +1,86 @@
+import numpy as np
+import os
+import json
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import experiment_runner
+from experiment_runner import _init_worker, job_seed
+
+def expand_grid(grid):
+	## {'thres': [0, 0.5], 'alpha': [1, 2]} -> one params dict per cell, last name varying fastest
+	names=list(grid)
+	return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+def _plain(value):
+	if isinstance(value, np.generic):
+		return value.item()
+	if isinstance(value, np.ndarray):
+		return value.tolist()
+	return value
+
+def cell_key(params):
+	## same parameters -> same key, whatever the order or numpy scalar type they were given in
+	text=json.dumps({name: _plain(value) for name, value in params.items()}, sort_keys=True)
+	return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def run_cell(run, params, seed):
+	## the seed follows the parameters, so a resumed sweep reproduces the cells it skipped
+	np.random.seed(job_seed(seed, int(cell_key(params), 16)))
+	return run(params, experiment_runner._shared)
+
+
+class SweepScheduler():
+	## runs run(params, shared) -> {name: array} once per grid cell on a process pool
+	## every finished cell is saved to path/<cell_key>.npz, a rerun only runs the missing ones
+	def __init__(self, run, grid, path, seed=0, processes=None, shared=None):
+		self.run_cell=run
+		self.grid={name: list(values) for name, values in grid.items()}
+		self.cells=expand_grid(self.grid)
+		self.path=path
+		self.seed=seed
+		self.processes=os.cpu_count() if processes is None else processes
+		self.shared=shared
+		os.makedirs(self.path, exist_ok=True)
+
+	def cell_path(self, params):
+		return os.path.join(self.path, cell_key(params)+'.npz')
+
+	def pending(self):
+		return [params for params in self.cells if not os.path.exists(self.cell_path(params))]
+
+	def save(self, params, output):
+		## written under a temporary name and renamed, a crash never leaves a half cell behind
+		final=self.cell_path(params)
+		temp=final+'.%d.tmp'%os.getpid()
+		with open(temp, 'wb') as f:
+			np.savez(f, _params=json.dumps({name: _plain(value) for name, value in params.items()}, sort_keys=True), **output)
+		os.replace(temp, final)
+
+	def load(self, params):
+		with np.load(self.cell_path(params)) as data:
+			return {name: data[name] for name in data.files if name!='_params'}
+
+	def run(self):
+		pending=self.pending()
+		print('sweep cells done/total', len(self.cells)-len(pending), len(self.cells))
+		if self.processes==1:
+			_init_worker(self.shared)
+			for params in pending:
+				self.save(params, run_cell(self.run_cell, params, self.seed))
+		elif pending:
+			with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker, initargs=(self.shared,)) as pool:
+				futures={pool.submit(run_cell, self.run_cell, params, self.seed): params for params in pending}
+				for future in as_completed(futures):
+					self.save(futures[future], future.result())
+		return self.results()
+
+	def results(self):
+		return [(params, self.load(params)) for params in self.cells]
+
+	def stack(self, name, results=None):
+		## output name of every cell as one array shaped (len(grid[a]), len(grid[b]), ...)+output shape
+		if results is None:
+			results=self.results()
+		values=np.array([output[name] for params, output in results])
+		return values.reshape(tuple(len(choices) for choices in self.grid.values())+values.shape[1:])
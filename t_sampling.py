@@ -4,10 +4,15 @@ from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
 import os 
+from scipy.linalg import cho_solve
+from linalg_utils import score_pool, cholesky_rank_one_update, batched_lower_transpose_solve
+from environment import Environment
+import instrumentation
+from user_state import UserState
 
 
 class TS():
-	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, delta, sigma, epsilon, state):
+	def __init__(self, dimension, user_num, item_num, pool_size, item_feature_matrix, true_user_feature_matrix, true_payoffs, alpha, delta, sigma, epsilon, state, user_state_path=None, refresh=100):
 		self.state=state
 		self.dimension=dimension
 		self.user_num=user_num
@@ -16,6 +21,7 @@ class TS():
 		self.item_feature_matrix=item_feature_matrix
 		self.true_user_feature_matrix=true_user_feature_matrix
 		self.true_payoffs=true_payoffs
+		self.environment=None
 		self.user_feature=np.zeros((self.user_num, self.dimension))
 		self.I=np.identity(self.dimension)
 		self.alpha=alpha
@@ -24,32 +30,46 @@ class TS():
 		self.epsilon=epsilon
 		self.v=self.sigma*np.sqrt(24/self.epsilon*self.dimension*np.log(1/self.delta))
 		self.beta=0
-		self.user_cov={}
-		self.user_xx={}
-		self.user_bias={}
+		self.users=UserState(self.user_num, self.dimension, path=user_state_path)
+		self.user_cov=self.users.add_matrix('user_cov')
+		self.user_xx=self.users.add_matrix('user_xx')
+		self.user_bias=self.users.add_vector('user_bias')
+		## lower Cholesky factor of each precision matrix user_cov, kept by rank-1 updates
+		self.user_chol=self.users.add_matrix('user_chol')
+		self.user_update_counter=self.users.add_counter('user_update_counter')
+		self.refresh=refresh
 		self.beta_list=[]
 		self.real_beta_list=[]
 
 	def initial_user_parameter(self):
-		for u in range(self.user_num):
-			self.user_cov[u]=self.alpha*np.identity(self.dimension)
-			self.user_xx[u]=0.01*np.identity(self.dimension)
-			self.user_bias[u]=np.zeros(self.dimension)
+		self.users.set_identity('user_cov', self.alpha)
+		self.users.set_identity('user_xx', 0.01)
+		self.users.reset('user_bias')
+		self.users.set_identity('user_chol', np.sqrt(self.alpha))
+		self.users.reset('user_update_counter')
+
+	def sample_user_features(self, user_indices):
+		## mean+L^{-T}z has covariance (LL^T)^{-1}, one triangular solve per user, batched over users
+		user_indices=np.asarray(user_indices)
+		z=np.random.standard_normal((len(user_indices), self.dimension))
+		return self.user_feature[user_indices]+batched_lower_transpose_solve(self.user_chol[user_indices], z)
+
+	def select_items(self, item_pools, user_indices):
+		## batched mode: one posterior sample and one argmax per (pool, user) pair
+		item_fs=self.item_feature_matrix[np.asarray(item_pools)]
+		samples=self.sample_user_features(user_indices)
+		max_indices=np.argmax(np.einsum('mpd,md->mp', item_fs, samples), axis=1)
+		return np.asarray(item_pools)[np.arange(len(max_indices)), max_indices]
 
 	def select_item(self, item_pool, user_index, time):
 		item_fs=self.item_feature_matrix[item_pool]
-		estimated_payoffs=np.zeros(self.pool_size)
-		sample_user_f=np.random.multivariate_normal(self.user_feature[user_index], np.linalg.pinv(self.user_cov[user_index]))
-		for j in range(self.pool_size):
-			x=item_fs[j]
-			est_y=np.dot(x, sample_user_f)
-			estimated_payoffs[j]=est_y
+		sample_user_f=self.sample_user_features([user_index])[0]
+		max_index, means, x_norms=score_pool(item_fs, sample_user_f, None, 0)
 
-		max_index=np.argmax(estimated_payoffs)
 		selected_item_index=item_pool[max_index]
 		selected_item_feature=item_fs[max_index]
 		true_payoff=self.true_payoffs[user_index, selected_item_index]
-		max_ideal_payoff=np.max(self.true_payoffs[user_index][item_pool])
+		max_ideal_payoff=self.environment.best_payoffs[time]
 		regret=max_ideal_payoff-true_payoff
 		return true_payoff, selected_item_feature, regret
 
@@ -57,9 +77,17 @@ class TS():
 		self.user_cov[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_xx[user_index]+=np.outer(selected_item_feature, selected_item_feature)
 		self.user_bias[user_index]+=true_payoff*selected_item_feature
-		self.user_feature[user_index]=np.dot(np.linalg.pinv(self.user_cov[user_index]), self.user_bias[user_index])
+		self.user_update_counter[user_index]+=1
+		if self.user_update_counter[user_index]%self.refresh==0:
+			self.user_chol[user_index]=np.linalg.cholesky(self.user_cov[user_index])
+		else:
+			cholesky_rank_one_update(self.user_chol[user_index], selected_item_feature)
+		self.user_feature[user_index]=cho_solve((self.user_chol[user_index], True), self.user_bias[user_index])
 
-	def run(self,user_array, item_pool_array, iteration):
+	def run(self,user_array, item_pool_array, iteration, environment=None):
+		if environment is None:
+			environment=Environment(user_array, item_pool_array, self.true_payoffs, iteration)
+		self.environment=environment
 		self.initial_user_parameter()
 		cumulative_regret=[0]
 		learning_error_list=[]
@@ -75,4 +103,7 @@ class TS():
 			learning_error_list.extend([error])
 			inst_regret.extend([regret])
 
+		self.users.flush()
 		return cumulative_regret[1:], learning_error_list
+
+instrumentation.register(TS, ['select_item', 'update_user_feature'])
@@ -17,7 +17,9 @@ from lapucb import LAPUCB
 from lapucb_sim import LAPUCB_SIM
 from club import CLUB
 from utils import *
+from results_store import ResultsStore
 path='../bandit_results/simulated/'
+store=ResultsStore(path+'results_store/')
 np.random.seed(2018)
 
 user_num=20
@@ -89,6 +91,8 @@ for index, smooth in enumerate(smooth_list):
 
 		lapucb_regret_matrix[l], lapucb_error_matrix[l]=lapucb_regret, lapucb_error
 		lapucb_sim_regret_matrix[l], lapucb_sim_error_matrix[l]=lapucb_sim_regret, lapucb_sim_error
+		store.write_run('lapucb', 'er', {'smooth': smooth, 'smoothness': smoothness}, l, regret=lapucb_regret, error=lapucb_error, beta=lapucb_beta, x_norm=lapucb_x_norm)
+		store.write_run('lapucb_sim', 'er', {'smooth': smooth, 'smoothness': smoothness}, l, regret=lapucb_sim_regret, error=lapucb_sim_error, beta=lapucb_sim_beta, x_norm=lapucb_sim_x_norm)
 
 	lapucb_regret=np.mean(lapucb_regret_matrix, axis=0)
 	lapucb_error=np.mean(lapucb_error_matrix, axis=0)
@@ -17,6 +17,7 @@ from lapucb import LAPUCB
 from lapucb_sim import LAPUCB_SIM
 from club import CLUB
 from utils import *
+from sweep_scheduler import SweepScheduler
 path='../bandit_results/simulated/'
 #np.random.seed(2018)
 
@@ -92,22 +93,12 @@ for i in range(user_num):
 
 np.fill_diagonal(true_lap, 1)
 
-thres_list=np.linspace(0,1,10)
-sparsity_list=np.zeros(10)
-
-linucb_regret_matrix=np.zeros((10, iteration))
-linucb_error_matrix=np.zeros((10, iteration))
-lapucb_regret_matrix=np.zeros((10, iteration))
-lapucb_error_matrix=np.zeros((10, iteration))
-lapucb_sim_regret_matrix=np.zeros((10, iteration))
-lapucb_sim_error_matrix=np.zeros((10, iteration))
-
-for index, thres in enumerate(thres_list):
-	true_adj=old_adj.copy()
-	true_adj[true_adj<thres]=0
-	sparsity_list[index]=np.sum(true_adj>0)/(user_num*(user_num-1))
+def run_threshold(params, shared):
+	## one sweep cell: the RBF graph with edges below thres removed
+	true_adj=shared['old_adj'].copy()
+	true_adj[true_adj<params['thres']]=0
+	sparsity=np.sum(true_adj>0)/(user_num*(user_num-1))
 	D=np.diag(np.sum(true_adj, axis=1))
-	lap=D-true_adj
 	true_lap=np.zeros((user_num, user_num))
 	for i in range(user_num):
 		for j in range(user_num):
@@ -117,74 +108,84 @@ for index, thres in enumerate(thres_list):
 				true_lap[i,j]=-true_adj[i,j]/D[i,i]
 
 	np.fill_diagonal(true_lap, 1)
+	item_feature_matrix, user_feature_matrix, true_payoffs, noise_matrix=shared['item_feature_matrix'], shared['user_feature_matrix'], shared['true_payoffs'], shared['noise_matrix']
+	user_seq, item_pool_seq=shared['user_seq'], shared['item_pool_seq']
 
 	linucb_model=LINUCB(dimension, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, alpha, delta, sigma, state)
-	lapucb_model=LAPUCB(dimension, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, noise_matrix, alpha, delta, sigma, beta, thres, state)
-	lapucb_sim_model=LAPUCB_SIM(dimension, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, noise_matrix, alpha, delta, sigma, beta, thres, state)
+	lapucb_model=LAPUCB(dimension, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, noise_matrix, alpha, delta, sigma, beta, params['thres'], state)
+	lapucb_sim_model=LAPUCB_SIM(dimension, user_num, item_num, pool_size, item_feature_matrix, user_feature_matrix, true_payoffs, true_adj, true_lap, noise_matrix, alpha, delta, sigma, beta, params['thres'], state)
 
 	linucb_regret, linucb_error, linucb_beta, linucb_x_norm, linucb_inst_regret, linucb_ucb, linucb_sum_x_norm, linucb_real_beta=linucb_model.run(user_seq, item_pool_seq, iteration)
 	lapucb_regret, lapucb_error, lapucb_beta, lapucb_x_norm, lapucb_inst_regret, lapucb_ucb, lapucb_sum_x_norm, lapucb_real_beta=lapucb_model.run(user_seq, item_pool_seq, iteration)
 	lapucb_sim_regret, lapucb_sim_error, lapucb_sim_beta, lapucb_sim_x_norm, lapucb_sim_avg_norm, lapucb_sim_inst_regret, lapucb_sim_ucb, lapucb_sim_sum_x_norm=lapucb_sim_model.run( user_seq, item_pool_seq, iteration)
-
-	linucb_regret_matrix[index], linucb_error_matrix[index]=linucb_regret, linucb_error
-	lapucb_regret_matrix[index], lapucb_error_matrix[index]=lapucb_regret, lapucb_error
-	lapucb_sim_regret_matrix[index], lapucb_sim_error_matrix[index]=lapucb_sim_regret, lapucb_sim_error
-
-diff=lapucb_sim_regret_matrix-lapucb_regret_matrix
-
-plt.figure()
-plt.plot(thres_list, diff[:,-1])
-plt.show()
-
-
-plt.figure()
-plt.plot(linucb_regret_matrix.T)
-plt.show()
-
-
-plt.figure(figsize=(5,5))
-plt.plot(linucb_regret_matrix[0], label='LinUCB')
-for ind, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_regret_matrix[ind], label='G-UCB %s'%(np.round(sparsity_list[ind], decimals=2)))
-plt.legend(loc=0, fontsize=12)
-plt.show()
-
-plt.figure(figsize=(5,5))
-plt.plot(linucb_regret_matrix[0], label='LinUCB')
-for ind2, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_sim_regret_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
-plt.legend(loc=0, fontsize=12)
-plt.show()
-
-
-
-plt.figure(figsize=(5,5))
-plt.plot(linucb_error_matrix[0], label='LinUCB')
-for ind, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_error_matrix[ind], label='G-UCB %s'%(np.round(sparsity_list[ind], decimals=2)))
-plt.legend(loc=0, fontsize=12)
-plt.show()
-
-plt.figure(figsize=(5,5))
-plt.plot(linucb_error_matrix[0], label='LinUCB')
-for ind2, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_sim_error_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
-plt.legend(loc=0, fontsize=12)
-plt.show()
-
-plt.figure(figsize=(5,5))
-plt.plot(linucb_error_matrix[0], label='LinUCB')
-for ind, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_error_matrix[ind], label='G-UCB %s'%(np.round(sparsity_list[ind], decimals=2)))
-for ind2, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_sim_error_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
-plt.legend(loc=0, fontsize=12)
-plt.show()
-
-
-plt.figure(figsize=(5,5))
-plt.plot(linucb_error_matrix[0], label='LinUCB')
-for ind2, sp in enumerate(sparsity_list):
-	plt.plot(lapucb_sim_error_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
-plt.legend(loc=0, fontsize=12)
-plt.show()
+	return {'sparsity': sparsity, 'linucb_regret': linucb_regret, 'linucb_error': linucb_error, 'lapucb_regret': lapucb_regret, 'lapucb_error': lapucb_error, 'lapucb_sim_regret': lapucb_sim_regret, 'lapucb_sim_error': lapucb_sim_error}
+
+## each threshold is a cell of a resumable sweep, finished cells are kept under path+'sparsity_sweep/'
+if __name__=='__main__':
+	thres_list=np.linspace(0,1,10)
+	shared={'old_adj': old_adj, 'item_feature_matrix': item_feature_matrix, 'user_feature_matrix': user_feature_matrix, 'true_payoffs': true_payoffs, 'noise_matrix': noise_matrix, 'user_seq': user_seq, 'item_pool_seq': item_pool_seq}
+	sweep=SweepScheduler(run_threshold, {'thres': thres_list}, path+'sparsity_sweep/', shared=shared)
+	results=sweep.run()
+	sparsity_list=sweep.stack('sparsity', results)
+	linucb_regret_matrix, linucb_error_matrix=sweep.stack('linucb_regret', results), sweep.stack('linucb_error', results)
+	lapucb_regret_matrix, lapucb_error_matrix=sweep.stack('lapucb_regret', results), sweep.stack('lapucb_error', results)
+	lapucb_sim_regret_matrix, lapucb_sim_error_matrix=sweep.stack('lapucb_sim_regret', results), sweep.stack('lapucb_sim_error', results)
+
+	diff=lapucb_sim_regret_matrix-lapucb_regret_matrix
+
+	plt.figure()
+	plt.plot(thres_list, diff[:,-1])
+	plt.show()
+
+
+	plt.figure()
+	plt.plot(linucb_regret_matrix.T)
+	plt.show()
+
+
+	plt.figure(figsize=(5,5))
+	plt.plot(linucb_regret_matrix[0], label='LinUCB')
+	for ind, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_regret_matrix[ind], label='G-UCB %s'%(np.round(sparsity_list[ind], decimals=2)))
+	plt.legend(loc=0, fontsize=12)
+	plt.show()
+
+	plt.figure(figsize=(5,5))
+	plt.plot(linucb_regret_matrix[0], label='LinUCB')
+	for ind2, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_sim_regret_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
+	plt.legend(loc=0, fontsize=12)
+	plt.show()
+
+
+
+	plt.figure(figsize=(5,5))
+	plt.plot(linucb_error_matrix[0], label='LinUCB')
+	for ind, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_error_matrix[ind], label='G-UCB %s'%(np.round(sparsity_list[ind], decimals=2)))
+	plt.legend(loc=0, fontsize=12)
+	plt.show()
+
+	plt.figure(figsize=(5,5))
+	plt.plot(linucb_error_matrix[0], label='LinUCB')
+	for ind2, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_sim_error_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
+	plt.legend(loc=0, fontsize=12)
+	plt.show()
+
+	plt.figure(figsize=(5,5))
+	plt.plot(linucb_error_matrix[0], label='LinUCB')
+	for ind, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_error_matrix[ind], label='G-UCB %s'%(np.round(sparsity_list[ind], decimals=2)))
+	for ind2, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_sim_error_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
+	plt.legend(loc=0, fontsize=12)
+	plt.show()
+
+
+	plt.figure(figsize=(5,5))
+	plt.plot(linucb_error_matrix[0], label='LinUCB')
+	for ind2, sp in enumerate(sparsity_list):
+		plt.plot(lapucb_sim_error_matrix[ind2], '-*', markevery=0.1, label='Local %s'%(np.round(sparsity_list[ind2], decimals=2)))
+	plt.legend(loc=0, fontsize=12)
+	plt.show()
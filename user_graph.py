@@ -0,0 +1,120 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+## undirected user graphs whose edges are only deleted, all with the same interface:
+## neighbors(u), remove_edges(u, users) and expand(frontier) -> boolean mask of neighbours
+
+class DenseGraph():
+	def __init__(self, user_num, rows=None, cols=None):
+		self.user_num=user_num
+		if rows is None:
+			self.adj=np.ones((self.user_num, self.user_num))
+		else:
+			self.adj=np.zeros((self.user_num, self.user_num))
+			self.adj[rows, cols]=1.0
+			self.adj[cols, rows]=1.0
+
+	def neighbors(self, user_index):
+		return np.flatnonzero(self.adj[user_index]>0)
+
+	def remove_edges(self, user_index, users):
+		self.adj[users, user_index]=0.0
+		self.adj[user_index, users]=0.0
+
+	def expand(self, frontier, chunk=1024):
+		reached=np.zeros(self.user_num, dtype=bool)
+		for start in range(0, len(frontier), chunk):
+			reached|=np.any(self.adj[frontier[start:start+chunk]]>0, axis=0)
+		return reached
+
+
+class BitsetGraph():
+	## one bit per user pair, n^2/8 bytes instead of 8n^2
+	def __init__(self, user_num, rows=None, cols=None):
+		self.user_num=user_num
+		byte_num=(self.user_num+7)//8
+		if rows is None:
+			self.bits=np.full((self.user_num, byte_num), 255, dtype=np.uint8)
+		else:
+			self.bits=np.zeros((self.user_num, byte_num), dtype=np.uint8)
+			np.bitwise_or.at(self.bits, (rows, cols>>3), self.bit(cols))
+			np.bitwise_or.at(self.bits, (cols, rows>>3), self.bit(rows))
+
+	def bit(self, users):
+		return (np.uint8(128)>>(np.asarray(users)&7)).astype(np.uint8)
+
+	def neighbors(self, user_index):
+		return np.flatnonzero(np.unpackbits(self.bits[user_index], count=self.user_num))
+
+	def remove_edges(self, user_index, users):
+		users=np.asarray(users, dtype=np.int64)
+		np.bitwise_and.at(self.bits, (np.full(len(users), user_index), users>>3), ~self.bit(users))
+		np.bitwise_and.at(self.bits, (users, np.full(len(users), user_index>>3)), ~self.bit(user_index))
+
+	def expand(self, frontier, chunk=1024):
+		reached=np.zeros(self.bits.shape[1], dtype=np.uint8)
+		for start in range(0, len(frontier), chunk):
+			reached|=np.bitwise_or.reduce(self.bits[frontier[start:start+chunk]], axis=0)
+		return np.unpackbits(reached, count=self.user_num).astype(bool)
+
+
+class TombstoneCSRGraph():
+	## CSR of the initial edges, a deleted edge is only marked dead
+	def __init__(self, user_num, rows, cols):
+		self.user_num=user_num
+		keys=np.unique(np.concatenate([rows*self.user_num+cols, cols*self.user_num+rows]))
+		self.keys=keys
+		self.indices=keys%self.user_num
+		self.indptr=np.searchsorted(keys, np.arange(self.user_num+1)*self.user_num)
+		self.alive=np.ones(len(keys), dtype=bool)
+
+	def neighbors(self, user_index):
+		start, end=self.indptr[user_index], self.indptr[user_index+1]
+		return self.indices[start:end][self.alive[start:end]]
+
+	def remove_edges(self, user_index, users):
+		users=np.asarray(users, dtype=np.int64)
+		keys=np.concatenate([user_index*self.user_num+users, users*self.user_num+user_index])
+		self.alive[np.searchsorted(self.keys, keys)]=False
+
+	def expand(self, frontier):
+		starts=self.indptr[frontier]
+		lens=self.indptr[frontier+1]-starts
+		edges=np.repeat(starts-np.cumsum(lens)+lens, lens)+np.arange(np.sum(lens))
+		reached=np.zeros(self.user_num, dtype=bool)
+		reached[self.indices[edges[self.alive[edges]]]]=True
+		return reached
+
+
+def random_edges(user_num, edge_prob):
+	## Erdos-Renyi G(n, p) edge list drawn without touching all n^2 pairs
+	pair_num=np.random.binomial(user_num*(user_num-1)//2, edge_prob)
+	rows=np.random.randint(user_num, size=pair_num)
+	cols=np.random.randint(user_num, size=pair_num)
+	keep=rows!=cols
+	keys=np.unique(np.minimum(rows, cols)[keep]*user_num+np.maximum(rows, cols)[keep])
+	return keys//user_num, keys%user_num
+
+
+def build_user_graph(user_num, backend='bitset', edge_prob=None):
+	## complete graph by default, a random sparse graph as in CLUB when edge_prob is given
+	## returns the graph and its initial connected-component labels
+	if edge_prob is None:
+		if backend=='csr':
+			raise ValueError('the csr backend needs a sparse initial graph, set edge_prob')
+		rows=cols=None
+		labels=np.zeros(user_num, dtype=np.int64)
+	else:
+		rows, cols=random_edges(user_num, edge_prob)
+		adj=csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(user_num, user_num))
+		labels=connected_components(adj, directed=False)[1]
+	if backend=='dense':
+		graph=DenseGraph(user_num, rows, cols)
+	elif backend=='bitset':
+		graph=BitsetGraph(user_num, rows, cols)
+	elif backend=='csr':
+		graph=TombstoneCSRGraph(user_num, rows, cols)
+	else:
+		raise ValueError('unknown graph backend %s'%backend)
+	return graph, labels
@@ -0,0 +1,82 @@
+import numpy as np
+import os
+import uuid
+
+class UserState():
+	def __init__(self, user_num, dimension, path=None, prefix=None):
+		self.user_num=user_num
+		self.dimension=dimension
+		self.path=path
+		## files of different models sharing one path must not collide
+		if prefix is None:
+			prefix=uuid.uuid4().hex[:8]+'_'
+		self.prefix=prefix
+		if self.path is not None:
+			os.makedirs(self.path, exist_ok=True)
+		self.names=[]
+
+	def allocate(self, name, shape, dtype=np.float64):
+		if self.path is None:
+			array=np.zeros(shape, dtype=dtype)
+		else:
+			array=np.lib.format.open_memmap(os.path.join(self.path, self.prefix+name+'.npy'), mode='w+', dtype=dtype, shape=shape)
+		setattr(self, name, array)
+		self.names.extend([name])
+		return array
+
+	def add_matrix(self, name, scale=0.0):
+		## allocate already returns zeros, only a nonzero diagonal needs writing
+		array=self.allocate(name, (self.user_num, self.dimension, self.dimension))
+		if scale!=0:
+			diag=np.arange(self.dimension)
+			array[:, diag, diag]=scale
+		return array
+
+	def add_vector(self, name):
+		return self.allocate(name, (self.user_num, self.dimension))
+
+	def add_counter(self, name):
+		return self.allocate(name, (self.user_num,), dtype=np.int64)
+
+	def add_flag(self, name):
+		return self.allocate(name, (self.user_num,), dtype=bool)
+
+	def set_identity(self, name, scale):
+		array=getattr(self, name)
+		array[:]=0.0
+		diag=np.arange(self.dimension)
+		array[:, diag, diag]=scale
+
+	def reset(self, name):
+		getattr(self, name)[:]=0
+
+	def flush(self):
+		if self.path is not None:
+			for name in self.names:
+				getattr(self, name).flush()
+
+
+class LaplacianUserCache():
+	## lazily refreshed Gram inverses and Laplacian neighbour averages shared by LAPUCB and LAPUCB_SIM
+	## expects user_xx(_inv, _inv_valid), user_ls, user_avg(_dirty) and L_csr/L_csc on the model
+	def get_user_xx_inv(self, users):
+		stale=users[~self.user_xx_inv_valid[users]]
+		if len(stale)>0:
+			self.user_xx_inv[stale]=np.linalg.inv(self.user_xx[stale])
+			self.user_xx_inv_valid[stale]=True
+		return self.user_xx_inv[users]
+
+	def get_user_avg(self, user_index):
+		if self.user_avg_dirty[user_index]:
+			start, end=self.L_csr.indptr[user_index], self.L_csr.indptr[user_index+1]
+			self.user_avg[user_index]=np.dot(self.L_csr.data[start:end], self.user_ls[self.L_csr.indices[start:end]])
+			self.user_avg_dirty[user_index]=False
+		return self.user_avg[user_index]
+
+	def mark_user_avg_dirty(self, user_index):
+		## user_avg[u] depends on user_ls[user_index] whenever L[u, user_index]!=0
+		start, end=self.L_csc.indptr[user_index], self.L_csc.indptr[user_index+1]
+		dirty=self.L_csc.indices[start:end]
+		self.user_avg_dirty[dirty]=True
+		self.user_avg_dirty[user_index]=True
+		return dirty
@@ -4,26 +4,42 @@ from sklearn.metrics.pairwise import rbf_kernel
 from sklearn.preprocessing import Normalizer, MinMaxScaler
 from scipy.sparse import csgraph 
 import scipy
+import scipy.sparse
 import os 
 from sklearn import datasets
+from sparse_graph import CSRGraph
 
 def create_networkx_graph(node_num, adj_matrix):
+	## each undirected edge is added once, in bulk and in row-major order
+	## as with a per-entry loop, a nonzero adj[j,i] (j>i) overrides adj[i,j]
 	G=nx.Graph()
 	G.add_nodes_from(list(range(node_num)))
-	for i in range(node_num):
-		for j in range(node_num):
-			if adj_matrix[i,j]!=0.0:
-				G.add_edge(i,j,weight=adj_matrix[i,j])
-			else:
-				pass
+	adj=scipy.sparse.csr_matrix(adj_matrix, shape=(node_num, node_num))
+	upper=scipy.sparse.triu(adj, format='csr')
+	lower=scipy.sparse.tril(adj, k=-1, format='csr').T.tocsr()
+	lower.eliminate_zeros()
+	adj=(upper-upper.multiply(lower!=0)+lower).tocsr()
+	adj.eliminate_zeros()
+	adj.sort_indices()
+	rows=np.repeat(np.arange(node_num), np.diff(adj.indptr))
+	G.add_weighted_edges_from(zip(rows.tolist(), adj.indices.tolist(), adj.data.tolist()))
 	return G, G.number_of_edges()
 
+def create_csr_graph(node_num, adj_matrix):
+	## networkx-free version of create_networkx_graph, from a dense or scipy sparse adj
+	G=CSRGraph(node_num, adj_matrix)
+	return G, G.number_of_edges()
 
-def RBF_graph(node_num, dimension, gamma=None, thres=None, clusters=False): ##
+
+def RBF_node_features(node_num, dimension, clusters=False):
 	if clusters==False:
 		node_f=np.random.uniform(low=-0.5, high=0.5, size=(node_num, dimension))
 	else:
 		node_f, _=datasets.make_blobs(n_samples=node_num, n_features=dimension, centers=5, cluster_std=0.1, center_box=(-1,1),  shuffle=False, random_state=2019)
+	return node_f
+
+def RBF_graph(node_num, dimension, gamma=None, thres=None, clusters=False): ##
+	node_f=RBF_node_features(node_num, dimension, clusters)
 	if gamma==None:
 		gamma=0.5
 	else:
@@ -37,6 +53,70 @@ def RBF_graph(node_num, dimension, gamma=None, thres=None, clusters=False): ##
 	np.fill_diagonal(adj,1)
 	return adj 
 
+def sparse_RBF_graph(node_num, dimension, gamma=None, thres=None, k=None, clusters=False, node_f=None, max_tile_entries=2**24, use_index=False):
+	## CSR version of RBF_graph: keeps the k most similar nodes and/or the rounded weights above thres
+	## distances are computed max_tile_entries at a time, or queried from a sklearn neighbour index
+	if node_f is None:
+		node_f=RBF_node_features(node_num, dimension, clusters)
+	if gamma==None:
+		gamma=0.5
+	if k is None and thres is None:
+		raise ValueError('sparse_RBF_graph needs k or thres')
+	if use_index:
+		rows, cols, vals=RBF_index_neighbors(node_f, gamma, thres, k)
+	else:
+		rows, cols, vals=RBF_tile_neighbors(node_f, gamma, thres, k, max_tile_entries)
+	adj=scipy.sparse.csr_matrix((vals, (rows, cols)), shape=(node_num, node_num))
+	if k is not None:
+		adj=adj.maximum(adj.T).tocsr()
+	adj.setdiag(1)
+	return adj
+
+def RBF_radius(gamma, thres):
+	## weights that round above thres sit at most this far away
+	return np.sqrt(-np.log(max(thres+0.005, 1e-12))/gamma)
+
+def RBF_tile_neighbors(node_f, gamma, thres, k, max_tile_entries):
+	## squared distances of a tile of rows to all nodes, weights only for the kept candidates
+	node_num=node_f.shape[0]
+	sq_norm=np.sum(node_f**2, axis=1)
+	tile=max(1, max_tile_entries//node_num)
+	rows, cols, vals=[], [], []
+	for start in range(0, node_num, tile):
+		end=min(start+tile, node_num)
+		dist=np.maximum(sq_norm[start:end,None]+sq_norm[None,:]-2*np.dot(node_f[start:end], node_f.T), 0.0)
+		dist[np.arange(end-start), np.arange(start, end)]=np.inf
+		if k is not None:
+			col=np.argpartition(dist, min(k, node_num-1)-1, axis=1)[:, :k]
+			row=np.repeat(np.arange(start, end), col.shape[1])
+			col=col.flatten()
+		else:
+			row, col=np.nonzero(dist<=RBF_radius(gamma, thres)**2)
+			row=row+start
+		val=np.round(np.exp(-gamma*dist[row-start, col]), decimals=2)
+		keep=val>(0.0 if thres is None else thres)
+		rows.extend([row[keep]])
+		cols.extend([col[keep]])
+		vals.extend([val[keep]])
+	return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+def RBF_index_neighbors(node_f, gamma, thres, k):
+	## tree-based neighbour search, only the candidate pairs are ever formed
+	from sklearn.neighbors import NearestNeighbors
+	node_num=node_f.shape[0]
+	index=NearestNeighbors().fit(node_f)
+	if k is not None:
+		dist, col=index.kneighbors(node_f, n_neighbors=min(k+1, node_num))
+		row=np.repeat(np.arange(node_num), col.shape[1])
+		dist, col=dist.flatten(), col.flatten()
+	else:
+		dist, col=index.radius_neighbors(node_f, radius=RBF_radius(gamma, thres))
+		row=np.repeat(np.arange(node_num), [len(c) for c in col])
+		dist, col=np.concatenate(dist), np.concatenate(col)
+	val=np.round(np.exp(-gamma*dist**2), decimals=2)
+	keep=(row!=col)&(val>(0.0 if thres is None else thres))
+	return row[keep], col[keep], val[keep]
+
 def ER_graph(node_num, prob):## unweighted
 	G=nx.erdos_renyi_graph(node_num, prob)
 	adj=nx.to_numpy_matrix(G)